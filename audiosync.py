@@ -0,0 +1,106 @@
+import os
+
+import tracing
+from metadatacache import get_clip_cache_path, prune_cache_directory
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+ENVELOPE_CACHE_DIRECTORY = 'envelopes'
+MAX_ENVELOPE_FILES = 5000
+DECODE_SAMPLE_RATE = 8000
+# 100 envelope samples a second; the correlation peak is interpolated to well under that
+ENVELOPE_SAMPLE_RATE = 100
+SAMPLES_PER_ENVELOPE_SAMPLE = DECODE_SAMPLE_RATE // ENVELOPE_SAMPLE_RATE
+# A peak this many standard deviations above the rest of the correlation is taken as a match
+MIN_SYNC_CONFIDENCE = 5
+
+
+class AudioSyncError(Exception):
+    pass
+
+
+def require_numpy():
+    if np == None:
+        raise AudioSyncError('Audio sync needs NumPy (pip install numpy)')
+
+
+def extract_envelope(clip_path):
+    # One decode pass to mono 8 kHz PCM, reduced to the rise in loudness between 10 ms blocks. Onsets like a whistle
+    # or a snap line up across cameras even when their gain and background noise differ.
+    require_numpy()
+    pcm = tracing.check_output(['ffmpeg', '-v', 'error', '-i', clip_path, '-vn', '-ac', '1',
+                                '-ar', str(DECODE_SAMPLE_RATE), '-f', 's16le', '-'])
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+    block_count = len(samples) // SAMPLES_PER_ENVELOPE_SAMPLE
+    if block_count < 2:
+        raise AudioSyncError(f'No audio to sync in {clip_path}')
+    blocks = samples[:block_count * SAMPLES_PER_ENVELOPE_SAMPLE].reshape(block_count, SAMPLES_PER_ENVELOPE_SAMPLE)
+    loudness = np.log1p(np.sqrt(np.mean(blocks * blocks, axis=1)))
+    onsets = np.maximum(np.diff(loudness, prepend=loudness[0]), 0)
+    return onsets.astype(np.float32)
+
+
+def load_envelope(clip_path):
+    require_numpy()
+    cache_path = get_clip_cache_path(clip_path, ENVELOPE_CACHE_DIRECTORY, '.npy')
+    if os.path.exists(cache_path):
+        os.utime(cache_path)
+        return np.load(cache_path)
+
+    envelope = extract_envelope(clip_path)
+    temporary_path = f'{cache_path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as cache_file:
+        np.save(cache_file, envelope)
+    os.replace(temporary_path, cache_path)
+    prune_cache_directory(os.path.dirname(cache_path), MAX_ENVELOPE_FILES)
+    return envelope
+
+
+def estimate_offset(base_envelope, secondary_envelope, max_offset=None):
+    # Returns (offset, confidence): a sound at time t in the secondary clip is heard at t + offset in the base clip
+    require_numpy()
+    base_envelope = base_envelope - base_envelope.mean()
+    secondary_envelope = secondary_envelope - secondary_envelope.mean()
+    fft_size = 1 << (len(base_envelope) + len(secondary_envelope) - 1).bit_length()
+    correlation = np.fft.irfft(np.fft.rfft(base_envelope, fft_size) * np.conj(np.fft.rfft(secondary_envelope, fft_size)),
+                               fft_size)
+    # Index k holds lag k for k < len(base), and wraps around to negative lags down to -(len(secondary) - 1)
+    lags = np.arange(fft_size)
+    lags[lags >= len(base_envelope)] -= fft_size
+    overlapping = lags > -len(secondary_envelope)
+    valid = overlapping.copy()
+    if max_offset != None:
+        valid &= np.abs(lags) <= max_offset * ENVELOPE_SAMPLE_RATE
+    if not valid.any():
+        raise AudioSyncError('The clips don\'t overlap within the allowed offset')
+    candidates = np.where(valid, correlation, -np.inf)
+    peak = int(np.argmax(candidates))
+
+    # Parabolic interpolation between the neighbouring lags gives the sub-sample part of the offset
+    fraction = 0.0
+    if 0 < peak < fft_size - 1 and valid[peak - 1] and valid[peak + 1]:
+        left, center, right = correlation[peak - 1], correlation[peak], correlation[peak + 1]
+        curvature = left - 2 * center + right
+        if curvature < 0:
+            fraction = 0.5 * (left - right) / curvature
+
+    offset = float(lags[peak] + fraction) / ENVELOPE_SAMPLE_RATE
+    # A stronger match outside max_offset means the best one inside it is most likely a coincidence
+    if correlation[overlapping].max() > correlation[peak]:
+        return offset, 0.0
+    spread = correlation[overlapping].std()
+    confidence = float((correlation[peak] - correlation[overlapping].mean()) / spread) if spread > 0 else 0.0
+    return offset, confidence
+
+
+@tracing.traced('audio_sync')
+def estimate_clip_offset(base_clip_path, secondary_clip_path, max_offset=None):
+    offset, confidence = estimate_offset(load_envelope(base_clip_path), load_envelope(secondary_clip_path), max_offset)
+    if confidence < MIN_SYNC_CONFIDENCE:
+        raise AudioSyncError(f'No clear audio match between {os.path.basename(base_clip_path)} and '
+                             f'{os.path.basename(secondary_clip_path)} (confidence {confidence:.1f})')
+    return offset
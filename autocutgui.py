@@ -1,13 +1,22 @@
 import json
 import os
 import re
-import subprocess
 import tkinter as tk
 import TkinterDnD2 as tkdnd
-from autointercut import VideoClipGroup, auto_sync_cut_folders, auto_cut_secondary
-from PIL import Image, ImageTk
+from audiosync import estimate_clip_offset
+from autointercut import VideoClipGroup, sync_cut_clip_groups, cut_secondary_clip_groups
+from backgroundjob import BackgroundJob, JobCancelled
+from clipdecoder import ClipDecoder, ClipPlayback, parse_frame_rate, preview_size
+from cutpool import report_failed_cuts
+from folderwatch import FolderWatcher
+from filmstrip import FilmstripBuilder, open_filmstrip
+from framecache import FrameCache, extract_frame
+from previewscheduler import PreviewScheduler
+import tracing
 
 
+WATCH_POLL_INTERVAL_MS = 500
+
 
 class ClipGroupFrame(tk.Frame):
     def __init__(self, root, clip_label):
@@ -15,6 +24,17 @@ class ClipGroupFrame(tk.Frame):
         self.clip_info = None
         self.selected_index = None
         self.seek_time = 0
+        self.video_clip_group = None
+        self.populate_job = None
+        self.folder_watcher = None
+        self.watch_job = None
+        self.decoder = None
+        self.prefetch_decoder = None
+        self.playback = None
+        self.frame_cache = FrameCache(self.decode_frame, prefetch_decode_frame=self.prefetch_frame)
+        self.filmstrip = None
+        self.filmstrip_builder = FilmstripBuilder().start()
+        self.preview_scheduler = PreviewScheduler(self, self.frame_cache.get, self.show_frame)
 
         # Clip listbox
         tk.Label(self, text=f'{clip_label} Clips').grid(row=0, column=0)
@@ -45,8 +65,19 @@ class ClipGroupFrame(tk.Frame):
         self.clip_panel.bind('<Button-1>', lambda event: self.focus_set())
         self.bind('<KeyPress>', self.seek)
 
+        # Playback controls
+        playback_frame = tk.Frame(self)
+        playback_frame.grid(row=3, column=0)
+        tk.Button(playback_frame, text='Play/Pause', command=lambda: self.toggle_playback(1)).grid(row=0, column=0)
+        tk.Button(playback_frame, text='Play 2x', command=lambda: self.toggle_playback(2)).grid(row=0, column=1)
+
+        # Probing status
+        self.status_lbl = tk.Label(self)
+        self.status_lbl.grid(row=4, column=0)
+
 
     def populate_listbox_items(self, event):
+        self.close_decoders()
         self.clip_info = None
         self.selected_index = None
         directory = event.data
@@ -56,55 +87,196 @@ class ClipGroupFrame(tk.Frame):
         if not os.path.isdir(directory):
             raise ValueError('Clip Source must be Directory')
 
-        self.video_clip_group = VideoClipGroup(directory, 0, 0)
-
+        if self.populate_job and self.populate_job.running:
+            self.populate_job.cancel()
+        if self.folder_watcher:
+            self.folder_watcher.stop()
+            self.folder_watcher = None
+        self.video_clip_group = None
         self.clip_name_lb.delete(0, tk.END)
+
+        job = BackgroundJob(self, lambda progress: VideoClipGroup(directory, 0, 0, progress),
+                            on_done=lambda video_clip_group: self.clip_group_loaded(job, video_clip_group),
+                            on_error=lambda e: self.clip_group_failed(job, e),
+                            on_progress=lambda status: self.status_lbl.configure(text=status))
+        self.populate_job = job.start()
+
+    def clip_group_loaded(self, job, video_clip_group):
+        # Results of a probe superseded by a later drop are dropped
+        if job is not self.populate_job:
+            return
+        self.video_clip_group = video_clip_group
+        self.status_lbl.configure(text=f'{len(video_clip_group.clips)} clips')
         for clip in self.video_clip_group.clips:
-            clip_name = os.path.basename(clip['file_path'])
+            clip_name = os.path.basename(clip.file_path)
             self.clip_name_lb.insert(tk.END, clip_name)
 
+        self.filmstrip_builder.clear()
+        self.filmstrip_builder.request([clip.file_path for clip in video_clip_group.clips])
+
+        # Clips landing in the folder from now on are probed and slotted in without reloading the whole group
+        self.folder_watcher = FolderWatcher(video_clip_group.directory).start()
+        self.after(WATCH_POLL_INTERVAL_MS, lambda: self.poll_folder_changes(self.folder_watcher, video_clip_group))
+
+    def poll_folder_changes(self, folder_watcher, video_clip_group):
+        if folder_watcher is not self.folder_watcher:
+            return
+        if not (self.watch_job and self.watch_job.running):
+            changed_paths, removed_paths = folder_watcher.get_changes()
+            if removed_paths:
+                self.remove_listbox_items(video_clip_group.remove_clips(removed_paths))
+            if changed_paths:
+                job = BackgroundJob(self, lambda progress: video_clip_group.probe_clips(changed_paths, progress),
+                                    on_done=lambda clips: self.clips_changed(video_clip_group, clips),
+                                    on_error=lambda e: self.status_lbl.configure(text=f'Failed: {e}'))
+                self.watch_job = job.start()
+        self.after(WATCH_POLL_INTERVAL_MS, lambda: self.poll_folder_changes(folder_watcher, video_clip_group))
+
+    def clips_changed(self, video_clip_group, clips):
+        if video_clip_group is not self.video_clip_group:
+            return
+        self.remove_listbox_items(video_clip_group.remove_clips({clip.file_path for clip in clips}))
+        for index, clip in zip(video_clip_group.insert_clips(clips), clips):
+            self.clip_name_lb.insert(index, os.path.basename(clip.file_path))
+        self.filmstrip_builder.request([clip.file_path for clip in clips])
+        self.update_selected_index()
+        self.status_lbl.configure(text=f'{len(video_clip_group.clips)} clips')
+
+    def remove_listbox_items(self, removed_indexes):
+        for index in removed_indexes:
+            self.clip_name_lb.delete(index)
+        if removed_indexes:
+            self.update_selected_index()
+
+    def update_selected_index(self):
+        # Keeps selected_index pointing at the open clip as clips are inserted and removed around it
+        if self.selected_index == None:
+            return
+        clip_paths = [clip.file_path for clip in self.video_clip_group.clips]
+        if self.current_clip_path in clip_paths:
+            self.selected_index = clip_paths.index(self.current_clip_path)
+        else:
+            self.close_decoders()
+            self.clip_info = None
+            self.selected_index = None
+
+    def clip_group_failed(self, job, e):
+        if job is not self.populate_job:
+            return
+        self.status_lbl.configure(text='Cancelled' if isinstance(e, JobCancelled) else f'Failed: {e}')
+
 
     def select_clip(self, event):
         self.seek_time = 0
         self.selected_index = self.clip_name_lb.index(tk.ANCHOR)
         self.current_clip_path = os.path.join(self.video_clip_group.directory, self.clip_name_lb.get(self.selected_index))
 
-        video_size_output = subprocess.check_output(['ffprobe',
-                                                     '-v', 'quiet',
-                                                     '-print_format', 'json',
-                                                     '-show_format',
-                                                     '-show_streams',
-                                                     self.current_clip_path])
+        video_size_output = tracing.check_output(['ffprobe',
+                                                  '-v', 'quiet',
+                                                  '-print_format', 'json',
+                                                  '-show_format',
+                                                  '-show_streams',
+                                                  self.current_clip_path])
 
         video_info = json.loads(video_size_output)
         self.clip_info = {}
         self.clip_info['width'] = video_info['streams'][0]['width']
         self.clip_info['height'] = video_info['streams'][0]['height']
         self.clip_info['duration'] = float(video_info['streams'][0]['duration'])
+        self.clip_info['frame_rate'] = parse_frame_rate(video_info['streams'][0]['r_frame_rate'])
+        self.clip_info['preview_size'] = preview_size(self.clip_info['width'], self.clip_info['height'])
+        self.open_decoders()
         self.update_clip_panel()
 
-
+    def open_decoders(self):
+        self.close_decoders()
+        self.decoder = ClipDecoder(self.current_clip_path, *self.clip_info['preview_size'],
+                                   self.clip_info['frame_rate'])
+        self.prefetch_decoder = ClipDecoder(self.current_clip_path, *self.clip_info['preview_size'],
+                                            self.clip_info['frame_rate'])
+        self.playback = ClipPlayback(self, self.decoder, self.show_frame, self.playback_stopped)
+        self.filmstrip = open_filmstrip(self.current_clip_path, *self.clip_info['preview_size'])
+        if self.filmstrip == None:
+            self.filmstrip_builder.prioritize(self.current_clip_path)
+
+    def close_decoders(self):
+        self.preview_scheduler.cancel()
+        if self.playback:
+            self.playback.stop()
+        if self.filmstrip:
+            self.filmstrip.close()
+            self.filmstrip = None
+        if self.decoder:
+            with self.decoder.lock:
+                self.decoder.close()
+        if self.prefetch_decoder:
+            with self.prefetch_decoder.lock:
+                self.prefetch_decoder.close()
+
+    def decode_frame(self, clip_path, seek_time):
+        if not self.decoder or clip_path != self.decoder.clip_path:
+            return extract_frame(clip_path, seek_time, *self.clip_info['preview_size'])
+        return self.decoder.frame_at(seek_time)
+
+    def prefetch_frame(self, clip_path, seek_time):
+        if not self.prefetch_decoder or clip_path != self.prefetch_decoder.clip_path:
+            return extract_frame(clip_path, seek_time, *self.clip_info['preview_size'])
+        return self.prefetch_decoder.frame_at(seek_time)
+
+    @tracing.traced('preview')
     def update_clip_panel(self):
-        timestamp = to_ffmpeg_duration(self.seek_time)
-        image_data = subprocess.check_output(['ffmpeg',
-                                              '-ss', timestamp,
-                                              '-i', self.current_clip_path,
-                                              '-vframes', '1',
-                                              '-f', 'image2pipe',
-                                              '-vcodec', 'rawvideo',
-                                              '-pix_fmt', 'rgb24',
-                                              '-'], bufsize=10 ** 8, stderr=subprocess.DEVNULL)
-        image = Image.frombytes('RGB', (self.clip_info['width'], self.clip_info['height']), image_data)
-        iwidth, iheight = image.size
-        aspect_ratio = iwidth / iheight
-        image = image.resize((640, int(640 / aspect_ratio)), Image.ANTIALIAS)
-        image = ImageTk.PhotoImage(image)
+        # Whole-second seeks are served from the clip's filmstrip once it has been built, and cached frames are
+        # shown at once. Anything else is handed to the preview scheduler, so the Tk thread never waits on a decode.
+        frame = self.get_filmstrip_frame(self.seek_time)
+        if frame != None:
+            self.preview_scheduler.cancel()
+            self.show_frame(frame)
+            return
+        image_data = self.frame_cache.peek(self.current_clip_path, self.seek_time)
+        if image_data != None:
+            self.preview_scheduler.cancel()
+            self.show_frame(image_data)
+        else:
+            self.preview_scheduler.request(self.current_clip_path, self.seek_time)
+        self.frame_cache.prefetch_neighbors(self.current_clip_path, self.seek_time, self.clip_info['duration'])
+
+    def get_filmstrip_frame(self, seek_time):
+        if self.filmstrip == None:
+            self.filmstrip = open_filmstrip(self.current_clip_path, *self.clip_info['preview_size'])
+        return self.filmstrip.frame_at(seek_time) if self.filmstrip else None
+
+    def show_frame(self, image_data):
+        # Frames arrive from the decoder as panel-sized PPM data, which Tk can load directly
+        image = tk.PhotoImage(data=image_data, format='PPM')
         self.clip_panel.configure(image=image)
         self.clip_panel.image = image
 
+    def set_seek_time(self, seek_time):
+        if self.playback.playing:
+            self.playback.stop()
+        self.seek_time = seek_time
+        self.update_clip_panel()
+
+    def toggle_playback(self, speed):
+        if not self.clip_info:
+            return
+        if self.playback.playing:
+            self.playback.stop()
+        else:
+            self.preview_scheduler.cancel()
+            self.playback.start(self.seek_time, speed)
+
+    def playback_stopped(self, position):
+        self.seek_time = max(0, min(int(position), int(self.clip_info['duration'] - 1)))
+
     def seek(self, event):
         if not self.clip_info:
             return
+        if event.keysym == 'p':
+            self.toggle_playback(1)
+            return
+        if self.playback.playing:
+            self.playback.stop()
         if event.keysym == 'Left':
             next_seek_time = self.seek_time - 1
         elif event.keysym == 'Right':
@@ -130,6 +302,9 @@ class AutocutGui(tk.Frame):
         self.secondary_clips_frame = ClipGroupFrame(self, 'Secondary')
         self.secondary_clips_frame.grid(row=0, column=1)
 
+        tk.Button(self, text='Sync Secondary by Audio', command=self.audio_sync).grid(row=1, column=0, columnspan=2,
+                                                                                   sticky='WE')
+
         # Buttons to perform autocuts
         match_and_rename_btn = tk.Button(self, text='Match and Rename',
                                         command=lambda : self.match('RENAME_AND_PAD'))
@@ -140,6 +315,15 @@ class AutocutGui(tk.Frame):
         autocut_secondary_from_primary_btn = tk.Button(self, text='Autocut Secondary from Primary',
                                                        command=self.autocut_secondary_from_primary)
         autocut_secondary_from_primary_btn.grid(row=4, column=0, columnspan=2, sticky='WE')
+        self.frame_accurate = tk.BooleanVar(value=False)
+        tk.Checkbutton(self, text='Frame accurate cuts (re-encode boundary GOPs)',
+                       variable=self.frame_accurate).grid(row=6, column=0, columnspan=2, sticky='W')
+
+        # Job status
+        self.job = None
+        self.status_lbl = tk.Label(self)
+        self.status_lbl.grid(row=5, column=0, sticky='W')
+        tk.Button(self, text='Cancel', command=self.cancel_job).grid(row=5, column=1, sticky='E')
 
     def match(self, option):
         primary_clip_group = self.primary_clips_frame.video_clip_group
@@ -149,12 +333,13 @@ class AutocutGui(tk.Frame):
         secondary_clip_group = self.secondary_clips_frame.video_clip_group
         secondary_seek_time = self.secondary_clips_frame.seek_time
         if primary_clip_group == None or primary_selected_index == None \
-            or secondary_clip_group == None or secondary_clip_group == None:
+            or secondary_clip_group == None or secondary_selected_index == None:
             return
 
-        auto_sync_cut_folders(primary_clip_group.directory, primary_selected_index, primary_seek_time,
-                              secondary_clip_group.directory, secondary_selected_index, secondary_seek_time,
-                              option)
+        # The groups probed when the folders were dropped are re-synchronized rather than probed again
+        clip_groups = [primary_clip_group.synchronized(primary_selected_index, primary_seek_time),
+                       secondary_clip_group.synchronized(secondary_selected_index, secondary_seek_time)]
+        self.start_job(lambda progress: sync_cut_clip_groups(clip_groups, option, progress))
 
 
     def autocut_secondary_from_primary(self):
@@ -165,11 +350,51 @@ class AutocutGui(tk.Frame):
         secondary_clip_group = self.secondary_clips_frame.video_clip_group
         secondary_seek_time = self.secondary_clips_frame.seek_time
         if primary_clip_group == None or primary_selected_index == None \
-                or secondary_clip_group == None or secondary_clip_group == None:
+                or secondary_clip_group == None or secondary_selected_index == None:
+            return
+
+        base_clip_group = primary_clip_group.synchronized(primary_selected_index, primary_seek_time)
+        secondary_clip_groups = [secondary_clip_group.synchronized(secondary_selected_index, secondary_seek_time)]
+        cut_mode = 'SMART_RENDER' if self.frame_accurate.get() else 'COPY'
+        self.start_job(lambda progress: cut_secondary_clip_groups(base_clip_group, secondary_clip_groups,
+                                                                  progress=progress, cut_mode=cut_mode))
+
+    def audio_sync(self):
+        if self.primary_clips_frame.clip_info == None or self.secondary_clips_frame.clip_info == None:
             return
+        primary_clip_path = self.primary_clips_frame.current_clip_path
+        secondary_clip_path = self.secondary_clips_frame.current_clip_path
+        self.start_job(lambda progress: estimate_clip_offset(primary_clip_path, secondary_clip_path),
+                       on_done=self.audio_sync_done)
+
+    def audio_sync_done(self, offset):
+        # Seeks both selected clips to the same moment, so the usual seek times carry the sub-second offset into
+        # Match and Autocut. A sound at t in the secondary clip is at t + offset in the primary clip.
+        primary_seek_time = self.primary_clips_frame.seek_time
+        secondary_seek_time = primary_seek_time - offset
+        if not 0 <= secondary_seek_time < self.secondary_clips_frame.clip_info['duration']:
+            secondary_seek_time = max(0, -offset)
+            primary_seek_time = secondary_seek_time + offset
+        self.primary_clips_frame.set_seek_time(primary_seek_time)
+        self.secondary_clips_frame.set_seek_time(secondary_seek_time)
+        self.status_lbl.configure(text=f'Secondary synced {offset:+.2f}s from primary')
+
+    def start_job(self, target, on_done=None):
+        if self.job and self.job.running:
+            return
+        self.job = BackgroundJob(self, target, on_done=on_done or self.job_done, on_error=self.job_failed,
+                                 on_progress=lambda status: self.status_lbl.configure(text=status)).start()
+
+    def cancel_job(self):
+        if self.job and self.job.running:
+            self.job.cancel()
+
+    def job_done(self, results):
+        failed_results = report_failed_cuts(results) if results else []
+        self.status_lbl.configure(text=f'Done, {len(failed_results)} cuts failed' if failed_results else 'Done')
 
-        auto_cut_secondary(primary_clip_group.directory, primary_selected_index, primary_seek_time,
-                              secondary_clip_group.directory, secondary_selected_index, secondary_seek_time,)
+    def job_failed(self, e):
+        self.status_lbl.configure(text='Cancelled' if isinstance(e, JobCancelled) else f'Failed: {e}')
 
 
 if __name__ == '__main__':
@@ -1,52 +1,121 @@
 import sys
 
+import argparse
+import bisect
+import copy
+import errno
+import heapq
+import json
+import operator
 import os
-import shutil
-import subprocess
 
 from autointercututils import *
+from cutpool import CUT_WORKERS_ENV, MAX_DEFAULT_CUT_WORKERS, CutJob, CutPool, run_cut_jobs, report_failed_cuts
+import exiftool
+from keyframeindex import load_keyframe_index, load_keyframe_indexes, to_input_seek_time, to_output_seek_time
+from smartrender import plan_smart_cut, probe_video_encoding, probe_video_encodings
+from materialize import materialize_file
+from metadatacache import MetadataCache
+from outputmanifest import OutputManifest, get_placeholder_paths
+import tracing
 
 BLANK_MOVIE_PATH = os.path.join(os.path.dirname(os.path.abspath(sys.argv[0])), 'blank.mp4')
+# Caps the number of output files a single ffmpeg pass keeps open
+MAX_SUBCLIPS_PER_PASS = 64
+# Synchronize times only have whole-second precision, so secondary cuts run on a little past the base clip's end
+CUT_END_PAD_SECONDS = 1
+# The seventh argument of the original positional command line
+LEGACY_OPTIONS = ['SYNC_CUT_DIRS', 'AUTO_CUT_SEC']
 
 
 class VideoClipGroup:
-    def __init__(self, directory, base_synchronize_index=0, base_offset=0):
+    @tracing.traced('probe_folder')
+    def __init__(self, directory, base_synchronize_index=0, base_offset=0, progress=None, et=None, cache=None):
         self.directory = directory
         self.clips = []
 
         self.clips = get_movie_file_paths(directory)
-        self.clips = with_datetime(self.clips)
-        self.clips = with_duration(self.clips)
-        self.clips = with_synchronized_time(self.clips, self.clips[base_synchronize_index]['datetime'], base_offset)
-        self.clips.sort(key=lambda movie_file: movie_file['synchronize_time'])
+        with_metadata(self.clips, progress=progress, et=et, cache=cache)
+        self.synchronize_start = self.clips[base_synchronize_index].start if self.clips else None
+        self.offset = base_offset
+        with_synchronized_time(self.clips, self.synchronize_start, base_offset)
+        self.clips.sort(key=operator.attrgetter('synchronize_time'))
+        self.synchronize_times = [clip.synchronize_time for clip in self.clips]
+
+    def synchronized(self, base_synchronize_index, base_offset):
+        # Re-synchronizes on clips[base_synchronize_index] of this (sorted) group without probing the folder again
+        clip_group = copy.copy(self)
+        clip_group.synchronize_start = self.clips[base_synchronize_index].start
+        clip_group.offset = base_offset
+        clip_group.clips = with_synchronized_time([copy.copy(clip) for clip in self.clips],
+                                                  clip_group.synchronize_start, base_offset)
+        clip_group.clips.sort(key=operator.attrgetter('synchronize_time'))
+        clip_group.synchronize_times = [clip.synchronize_time for clip in clip_group.clips]
+        return clip_group
+
+    def probe_clips(self, file_paths, progress=None):
+        # Probes new or changed clips for insert_clips; safe to run off the thread that owns the group. Placeholders
+        # a sync cut wrote into the folder are left out, as get_movie_file_paths does.
+        placeholder_paths = get_placeholder_paths(self.directory)
+        movie_files = with_metadata([Clip(file_path) for file_path in sorted(file_paths)
+                                     if file_path not in placeholder_paths], progress=progress)
+        synchronize_start = self.synchronize_start
+        if synchronize_start == None and movie_files:
+            synchronize_start = min(movie_file.start for movie_file in movie_files)
+        return with_synchronized_time(movie_files, synchronize_start, self.offset)
+
+    def insert_clips(self, clips):
+        # Returns the index each clip landed at, in insertion order
+        if self.synchronize_start == None and clips:
+            self.synchronize_start = min(clip.start for clip in clips)
+        indexes = []
+        for clip in clips:
+            index = bisect.bisect_right(self.synchronize_times, clip.synchronize_time)
+            self.synchronize_times.insert(index, clip.synchronize_time)
+            self.clips.insert(index, clip)
+            indexes.append(index)
+        return indexes
+
+    def remove_clips(self, file_paths):
+        # Returns the removed indexes from last to first, so they can be deleted from a listbox in that order
+        removed_indexes = []
+        for index in reversed(range(len(self.clips))):
+            if self.clips[index].file_path in file_paths:
+                del self.clips[index]
+                del self.synchronize_times[index]
+                removed_indexes.append(index)
+        return removed_indexes
+
+
+@tracing.traced()
+def get_synchronized_timeline(clip_groups):
+    # Sweep over the clip start times of all K groups at once. Each row of the timeline takes the earliest
+    # unmatched clip and whichever other groups' next clips start before it ends, so it generalizes the
+    # primary/secondary pairing to any number of angles in O(total clips * log K).
+    clip_lists = [clip_group.clips for clip_group in clip_groups]
+    heads = [(clips[0].synchronize_time, g, 0) for g, clips in enumerate(clip_lists) if clips]
+    heapq.heapify(heads)
+    timeline = []
+    while heads:
+        _, g, i = heapq.heappop(heads)
+        clip = clip_lists[g][i]
+        clip_end_time = clip.synchronize_time + clip.duration
+        row = [None] * len(clip_lists)
+        row[g] = clip.file_path
+        matched = [(g, i)]
+        while heads and heads[0][0] < clip_end_time:
+            _, h, j = heapq.heappop(heads)
+            row[h] = clip_lists[h][j].file_path
+            matched.append((h, j))
+        for h, j in matched:
+            if j + 1 < len(clip_lists[h]):
+                heapq.heappush(heads, (clip_lists[h][j + 1].synchronize_time, h, j + 1))
+        timeline.append(tuple(row))
+    return timeline
 
 
 def get_synchronized_grouping(base_clip_group, secondary_clip_group):
-    base_clips = base_clip_group.clips
-    secondary_clips = secondary_clip_group.clips
-    matched_clip_pairs = []
-    i = 0
-    j = 0
-    while i < len(base_clips) or j < len(secondary_clips):
-        if not i < len(base_clips):
-            matched_clip_pairs.append((None, secondary_clips[j]['file_path']))
-            j += 1
-            continue
-        if not j < len(secondary_clips):
-            matched_clip_pairs.append((base_clips[i]['file_path'], None))
-            i += 1
-            continue
-        if do_times_overlap(base_clips[i], secondary_clips[j]):
-            matched_clip_pairs.append((base_clips[i]['file_path'], secondary_clips[j]['file_path']))
-            i += 1
-            j += 1
-        elif base_clips[i]['synchronize_time'] < secondary_clips[j]['synchronize_time']:
-            matched_clip_pairs.append((base_clips[i]['file_path'], None))
-            i += 1
-        else:
-            matched_clip_pairs.append((None, secondary_clips[j]['file_path']))
-            j += 1
-    return matched_clip_pairs
+    return get_synchronized_timeline([base_clip_group, secondary_clip_group])
 
 
 def get_sync_name(index, extension):
@@ -61,138 +130,476 @@ def get_sync_name(index, extension):
         return f'aic{index}{extension}'
 
 
-def auto_sync_cut_folders(base_directory, base_synchronize_index, base_offset,
-                          secondary_directory, secondary_synchronize_index, secondary_offset, option='RENAME_AND_PAD'):
-
-    base_clip_group = VideoClipGroup(base_directory, base_synchronize_index, base_offset)
-    secondary_clip_group = VideoClipGroup(secondary_directory, secondary_synchronize_index, secondary_offset)
-    matched_clip_pairs = get_synchronized_grouping(base_clip_group, secondary_clip_group)
+@tracing.traced()
+def sync_cut_clip_groups(clip_groups, option='RENAME_AND_PAD', progress=None):
+    timeline = get_synchronized_timeline(clip_groups)
 
     if option == 'RENAME_AND_PAD':
         output_dir = ''
     else:
         output_dir = 'output'
-        if not os.path.exists(os.path.join(base_directory, 'output')):
-            os.makedirs(os.path.join(base_directory, 'output'))
-        if not os.path.exists(os.path.join(secondary_directory, 'output')):
-            os.makedirs(os.path.join(secondary_directory, 'output'))
-
-    for i, matched_clip_pair in enumerate(matched_clip_pairs):
-        if matched_clip_pair[0]:
-            _, extension = os.path.splitext(matched_clip_pair[0])
-            if option == 'RENAME_AND_PAD':
-                os.rename(matched_clip_pair[0], os.path.join(os.path.dirname(matched_clip_pair[0]), get_sync_name(i, extension)))
-            else:
-                shutil.copyfile(matched_clip_pair[0], os.path.join(base_directory, output_dir, get_sync_name(i, extension)))
-        else:
-            shutil.copyfile(BLANK_MOVIE_PATH, os.path.join(base_directory, output_dir, get_sync_name(i, '.mp4')))
-        if matched_clip_pair[1]:
-            _, extension = os.path.splitext(matched_clip_pair[1])
-            if option == 'RENAME_AND_PAD':
-                os.rename(matched_clip_pair[1], os.path.join(os.path.dirname(matched_clip_pair[1]), get_sync_name(i, extension)))
+        for clip_group in clip_groups:
+            if not os.path.exists(os.path.join(clip_group.directory, 'output')):
+                os.makedirs(os.path.join(clip_group.directory, 'output'))
+
+    # Outputs an earlier, interrupted run already finished are recorded in each folder's manifest and left alone
+    output_manifests = [OutputManifest(os.path.join(clip_group.directory, output_dir)) for clip_group in clip_groups]
+    if option == 'RENAME_AND_PAD':
+        clip_paths = move_rename_conflicts_aside(timeline, clip_groups)
+        # Where clips still waiting for their sync name are now, which no placeholder may be written over
+        unrenamed_paths = {get_rename_key(clip_paths.get(clip_path, clip_path))
+                           for row in timeline for clip_path in row if clip_path}
+    else:
+        clip_paths = {}
+        unrenamed_paths = set()
+
+    stage = 'Renaming clips' if option == 'RENAME_AND_PAD' else 'Copying clips'
+    for i, row in enumerate(timeline):
+        if progress:
+            progress.check_cancelled()
+            progress.update(stage, i, len(timeline))
+        for clip_group, output_manifest, clip_path in zip(clip_groups, output_manifests, row):
+            if clip_path:
+                _, extension = os.path.splitext(clip_path)
+                output_path = os.path.join(clip_group.directory, output_dir, get_sync_name(i, extension))
+                if option == 'RENAME_AND_PAD':
+                    rename_clip(clip_paths.get(clip_path, clip_path), output_path, output_manifest)
+                    unrenamed_paths.discard(get_rename_key(clip_paths.get(clip_path, clip_path)))
+                elif not output_manifest.plan(output_path, 'copy', clip_path):
+                    materialize_file(clip_path, output_path)
+                    output_manifest.mark_done(output_path)
             else:
-                shutil.copyfile(matched_clip_pair[1], os.path.join(secondary_directory, output_dir, get_sync_name(i, extension)))
+                materialize_placeholder(os.path.join(clip_group.directory, output_dir, get_sync_name(i, '.mp4')),
+                                        output_manifest, unrenamed_paths)
+        if progress and option != 'RENAME_AND_PAD':
+            progress.add_bytes(sum(os.path.getsize(clip_path) for clip_path in row if clip_path))
+    if progress:
+        progress.update(stage, len(timeline), len(timeline))
+
+
+def move_rename_conflicts_aside(timeline, clip_groups):
+    # A clip already carrying the sync name another clip is about to be renamed to, or a placeholder is about to be
+    # written to (from an earlier run with other offsets, say), is moved to a temporary name first. Returns the clips
+    # moved, mapped to where they are now.
+    renames = [(clip_path, os.path.join(os.path.dirname(clip_path), get_sync_name(i, os.path.splitext(clip_path)[1])))
+               for i, row in enumerate(timeline) for clip_path in row if clip_path]
+    pending_targets = {get_rename_key(output_path) for clip_path, output_path in renames if clip_path != output_path}
+    pending_targets.update(get_rename_key(os.path.join(clip_group.directory, get_sync_name(i, '.mp4')))
+                           for i, row in enumerate(timeline) for clip_group, clip_path in zip(clip_groups, row)
+                           if not clip_path)
+    moved_paths = {}
+    for clip_path, output_path in renames:
+        if clip_path != output_path and get_rename_key(clip_path) in pending_targets:
+            directory, file_name = os.path.split(clip_path)
+            moved_paths[clip_path] = os.path.join(directory, f'aic_renaming_{file_name}')
+            os.rename(clip_path, moved_paths[clip_path])
+    return moved_paths
+
+
+def get_rename_key(file_path):
+    # Clips keep their camera's extension case while placeholders are .mp4, so aic0001.MP4 and aic0001.mp4 are the
+    # same file on a case-insensitive filesystem
+    return normalize_path(file_path).lower()
+
+
+def rename_clip(clip_path, output_path, output_manifest):
+    if clip_path != output_path:
+        output_manifest.plan(output_path, 'rename', clip_path)
+        os.replace(clip_path, output_path)
+        output_manifest.mark_done(output_path)
+    elif not output_manifest.is_done(output_path):
+        # Renamed by an earlier run that stopped before recording it
+        output_manifest.plan(output_path, 'rename', output_path)
+        output_manifest.mark_done(output_path)
+
+
+def materialize_placeholder(output_path, output_manifest, unrenamed_paths=()):
+    if get_rename_key(output_path) in unrenamed_paths:
+        raise OSError(errno.EEXIST, 'Refusing to write a placeholder over a clip that has not been renamed yet',
+                      output_path)
+    if not output_manifest.plan(output_path, 'placeholder', BLANK_MOVIE_PATH):
+        # Saved before the placeholder exists, so it is never listed as a camera clip even after a crash
+        output_manifest.save()
+        materialize_file(BLANK_MOVIE_PATH, output_path)
+        output_manifest.mark_done(output_path)
+
+
+def skip_done_cut_jobs(cut_jobs, output_manifest, cut_mode):
+    # Jobs whose outputs are all done exactly as planned are dropped, like targets of an incremental build
+    pending_jobs = []
+    for cut_job in cut_jobs:
+        # Every output is planned, so none can be left out of the manifest by all() stopping early
+        done = [output_manifest.plan(output_path, 'cut', *cut_job.output_ranges[output_path], cut_mode=cut_mode)
+                for output_path in cut_job.output_paths]
+        if not all(done):
+            pending_jobs.append(cut_job)
+    output_manifest.save()
+    return pending_jobs
+
+
+def record_cut_result(result, output_manifests):
+    # output_manifests maps each output directory to its manifest
+    for output_path in result.job.output_paths:
+        output_manifest = output_manifests[os.path.dirname(output_path)]
+        if result.ok and os.path.exists(output_path):
+            output_manifest.mark_done(output_path)
         else:
-            shutil.copyfile(BLANK_MOVIE_PATH, os.path.join(secondary_directory, output_dir, get_sync_name(i, '.mp4')))
+            output_manifest.mark_failed(output_path)
 
 
-def auto_cut_secondary(base_directory, base_synchronize_index, base_offset,
-                        secondary_directory, secondary_synchronize_index, secondary_offset):
+def auto_sync_cut_folders(base_directory, base_synchronize_index, base_offset,
+                          secondary_directory, secondary_synchronize_index, secondary_offset, option='RENAME_AND_PAD',
+                          progress=None):
+    auto_sync_cut_angles([(base_directory, base_synchronize_index, base_offset),
+                          (secondary_directory, secondary_synchronize_index, secondary_offset)], option, progress)
+
+
+def auto_sync_cut_angles(angles, option='RENAME_AND_PAD', progress=None):
+    # angles is a list of (directory, synchronize_index, offset), one per camera
+    clip_groups = [VideoClipGroup(directory, synchronize_index, offset, progress)
+                   for directory, synchronize_index, offset in angles]
+    sync_cut_clip_groups(clip_groups, option, progress)
 
-    base_clip_group = VideoClipGroup(base_directory, base_synchronize_index, base_offset)
-    secondary_clip_group = VideoClipGroup(secondary_directory, secondary_synchronize_index, secondary_offset)
 
+@tracing.traced()
+def plan_secondary_cuts(base_clip_group, secondary_clip_group, cut_mode='COPY'):
     base_clips = base_clip_group.clips
     secondary_clips = secondary_clip_group.clips
+    output_directory = os.path.join(secondary_clip_group.directory, 'output')
 
-    if not os.path.exists(os.path.join(secondary_directory, 'output')):
-        os.makedirs(os.path.join(secondary_directory, 'output'))
-
+    matches = []
     j = 0
-    sm_st = secondary_clips[j]['synchronize_time']
-    sm_path = secondary_clips[j]['file_path']
     for i, base_clip in enumerate(base_clips):
-        bm_st = base_clip['synchronize_time']
-        bm_duration = base_clip['duration']
+        bm_st = base_clip.synchronize_time
+        bm_duration = base_clip.duration
 
-        while bm_st > sm_st + secondary_clips[j]['duration']:
+        while j < len(secondary_clips) and bm_st > secondary_clips[j].synchronize_time + secondary_clips[j].duration:
             j += 1
-            if j < len(secondary_clips):
-                sm_st = secondary_clips[j]['synchronize_time']
-                sm_path = secondary_clips[j]['file_path']
-            else:
-                break
-
-        if not j < len(secondary_clips) or bm_st + bm_duration < sm_st:
-            shutil.copyfile(BLANK_MOVIE_PATH, os.path.join(os.path.join(secondary_directory, 'output', get_sync_name(i, '.mp4'))))
-        elif bm_st < sm_st and bm_st + bm_duration > sm_st:
-            subclip_duration = to_ffmpeg_duration(bm_st + bm_duration - sm_st + 1)
-            subclip_name = os.path.join(secondary_directory, 'output', get_sync_name(i, os.path.splitext(sm_path)[1]))
-            sub_proc = subprocess.Popen(['ffmpeg', '-y', '-ss', '00:00:00', '-i', sm_path, '-c', 'copy',
-                                         '-t', subclip_duration, subclip_name])
-            sub_proc.wait()
-        else:
-            subclip_duration = to_ffmpeg_duration(bm_duration + 2)
-            subclip_start_time = to_ffmpeg_duration(bm_st - sm_st - 1) if bm_st - sm_st - 1 > 0 else to_ffmpeg_duration(bm_st - sm_st)
-            subclip_name = os.path.join(secondary_directory, 'output', get_sync_name(i, os.path.splitext(sm_path)[1]))
-            sub_proc = subprocess.Popen(['ffmpeg', '-y', '-ss', subclip_start_time, '-i', sm_path, '-c', 'copy',
-                                         '-t', subclip_duration, subclip_name])
-            sub_proc.wait()
 
+        if not j < len(secondary_clips) or bm_st + bm_duration < secondary_clips[j].synchronize_time:
+            matches.append((i, None))
+        else:
+            matches.append((i, secondary_clips[j]))
+
+    secondary_paths = [secondary_clip.file_path for _, secondary_clip in matches if secondary_clip != None]
+    keyframe_indexes = load_keyframe_indexes(secondary_paths)
+    if cut_mode == 'SMART_RENDER':
+        video_encodings = probe_video_encodings(secondary_paths)
+
+    cut_jobs = []
+    placeholder_paths = []
+    for i, secondary_clip in matches:
+        if secondary_clip == None:
+            placeholder_paths.append(os.path.join(output_directory, get_sync_name(i, '.mp4')))
+            continue
 
-def cut_clip_into_subclips(file_path, mark_time_pairs):
-    file_path = os.path.abspath(file_path)
-    directory = os.path.dirname(file_path)
-    if not os.path.exists(os.path.join(directory, 'qcoutput')):
-        os.makedirs(os.path.join(directory, 'qcoutput'))
-
-    for i, mark_time_pair in enumerate(mark_time_pairs):
-        print(mark_time_pair)
-        subclip_name = os.path.join(directory, 'qcoutput', get_sync_name(i, os.path.splitext(file_path)[1]))
-        sub_proc = subprocess.Popen(['ffmpeg', '-y', '-ss', mark_time_pair[0], '-i', file_path, '-c', 'copy', '-t',
-                                     mark_time_pair[1], subclip_name])
-        sub_proc.wait()
+        bm_st = base_clips[i].synchronize_time
+        bm_duration = base_clips[i].duration
+        sm_st = secondary_clip.synchronize_time
+        sm_path = secondary_clip.file_path
+        subclip_name = os.path.join(output_directory, get_sync_name(i, os.path.splitext(sm_path)[1]))
+        if cut_mode == 'SMART_RENDER':
+            subclip_start = max(0, bm_st - sm_st)
+            subclip_duration = bm_st + bm_duration - sm_st - subclip_start + CUT_END_PAD_SECONDS
+            cut_jobs.append(plan_smart_cut(sm_path, subclip_start, subclip_duration, subclip_name,
+                                           keyframe_indexes[sm_path], video_encodings[sm_path]))
+            continue
+        # Stream copy can only start on a keyframe, so the cut starts on the one at or before the base clip's start
+        subclip_start = keyframe_indexes[sm_path].preceding_keyframe(max(0, bm_st - sm_st))
+        subclip_duration = bm_st + bm_duration - sm_st - subclip_start + CUT_END_PAD_SECONDS
+        cut_jobs.append(CutJob(['ffmpeg', '-y', '-ss', to_ffmpeg_duration(to_input_seek_time(subclip_start)),
+                                '-i', sm_path, '-c', 'copy', '-t', to_ffmpeg_duration(subclip_duration), subclip_name],
+                               subclip_name, output_ranges={subclip_name: (sm_path, subclip_start, subclip_duration)}))
+    return cut_jobs, placeholder_paths
 
 
+def cut_secondary_clip_groups(base_clip_group, secondary_clip_groups, cut_pool=None, progress=None, cut_mode='COPY'):
+    # Cuts for every secondary angle are planned up front and share one run of the cut pool
+    cut_jobs = []
+    output_manifests = {}
+    for secondary_clip_group in secondary_clip_groups:
+        output_directory = os.path.join(secondary_clip_group.directory, 'output')
+        if not os.path.exists(output_directory):
+            os.makedirs(output_directory)
+        output_manifest = output_manifests[output_directory] = OutputManifest(output_directory)
 
-if __name__ == '__main__':
-    # Parameter should be baseDirectory baseSynchronizeIndex baseOffset
-    # secondaryDirectory secondarySynchronizeIndex secondaryOffset option
-    try:
-        base_directory = sys.argv[1]
-        base_sync_index = int(sys.argv[2])
-        base_offset = int(sys.argv[3])
-
-        secondary_directory = sys.argv[4]
-        secondary_sync_index = int(sys.argv[5])
-        secondary_offset = int(sys.argv[6])
-
-        option = sys.argv[7]
-
-        if option.upper() == 'SYNC_CUT_DIRS':
-            auto_sync_cut_folders(base_directory, base_sync_index, base_offset,
-                                  secondary_directory, secondary_sync_index, secondary_offset)
-        elif option.upper() == 'AUTO_CUT_SEC':
-            auto_cut_secondary(base_directory, base_sync_index, base_offset,
-                                    secondary_directory, secondary_sync_index, secondary_offset)
-        else:
-            print('No proper option given for auto sync', file=sys.stderr)
+        secondary_cut_jobs, placeholder_paths = plan_secondary_cuts(base_clip_group, secondary_clip_group, cut_mode)
+        for placeholder_path in placeholder_paths:
+            materialize_placeholder(placeholder_path, output_manifest)
+        cut_jobs.extend(skip_done_cut_jobs(secondary_cut_jobs, output_manifest, cut_mode))
 
+    return run_cut_jobs(cut_jobs, cut_pool, progress, lambda result: record_cut_result(result, output_manifests))
 
-    except IndexError:
-        print('Incorrect arguments passed to autointercut.', file=sys.stderr)
 
+def auto_cut_secondary(base_directory, base_synchronize_index, base_offset,
+                        secondary_directory, secondary_synchronize_index, secondary_offset, cut_pool=None,
+                        progress=None, cut_mode='COPY'):
+    return auto_cut_secondaries((base_directory, base_synchronize_index, base_offset),
+                                [(secondary_directory, secondary_synchronize_index, secondary_offset)],
+                                cut_pool, progress, cut_mode)
 
 
+def auto_cut_secondaries(base_angle, secondary_angles, cut_pool=None, progress=None, cut_mode='COPY'):
+    # Angles are (directory, synchronize_index, offset); each folder is probed once
+    base_clip_group = VideoClipGroup(*base_angle, progress=progress)
+    secondary_clip_groups = [VideoClipGroup(*secondary_angle, progress=progress) for secondary_angle in secondary_angles]
+    return cut_secondary_clip_groups(base_clip_group, secondary_clip_groups, cut_pool, progress, cut_mode)
 
 
+def cut_clip_into_subclips(file_path, mark_time_pairs, cut_pool=None, progress=None, cut_mode='COPY'):
+    # In COPY mode the source is demuxed once per pass and every marked range is written as its own output of that
+    # pass. With stream copy, output-side -ss drops every packet before it, so each start is moved back to a keyframe.
+    # SMART_RENDER cuts each range frame-accurately as its own job.
+    file_path = os.path.abspath(file_path)
+    directory = os.path.dirname(file_path)
+    output_directory = os.path.join(directory, 'qcoutput')
+    if not os.path.exists(output_directory):
+        os.makedirs(output_directory)
+    output_manifest = OutputManifest(output_directory)
+    output_manifests = {output_directory: output_manifest}
+    keyframe_index = load_keyframe_index(file_path)
+
+    if cut_mode == 'SMART_RENDER':
+        video_encoding = probe_video_encoding(file_path)
+        cut_jobs = [plan_smart_cut(file_path, from_ffmpeg_duration(subclip_start),
+                                   from_ffmpeg_duration(subclip_duration),
+                                   os.path.join(output_directory, get_sync_name(i, os.path.splitext(file_path)[1])),
+                                   keyframe_index, video_encoding)
+                    for i, (subclip_start, subclip_duration) in enumerate(mark_time_pairs)]
+        return run_cut_jobs(skip_done_cut_jobs(cut_jobs, output_manifest, cut_mode), cut_pool, progress,
+                            lambda result: record_cut_result(result, output_manifests))
+
+    subclips = []
+    for i, mark_time_pair in enumerate(mark_time_pairs):
+        print(mark_time_pair)
+        subclip_name = os.path.join(output_directory, get_sync_name(i, os.path.splitext(file_path)[1]))
+        mark_start = from_ffmpeg_duration(mark_time_pair[0])
+        subclip_start = keyframe_index.preceding_keyframe(mark_start)
+        subclip_duration = from_ffmpeg_duration(mark_time_pair[1]) + mark_start - subclip_start
+        # Only ranges not already cut as planned are batched into passes
+        if not output_manifest.plan(subclip_name, 'cut', file_path, subclip_start, subclip_duration, cut_mode):
+            subclips.append((subclip_name, subclip_start, subclip_duration))
+    output_manifest.save()
+
+    cut_jobs = []
+    for first_index in range(0, len(subclips), MAX_SUBCLIPS_PER_PASS):
+        args = ['ffmpeg', '-y', '-i', file_path]
+        output_ranges = {}
+        for subclip_name, subclip_start, subclip_duration in subclips[first_index:first_index + MAX_SUBCLIPS_PER_PASS]:
+            args.extend(['-ss', to_ffmpeg_duration(to_output_seek_time(subclip_start)), '-c', 'copy',
+                         '-t', to_ffmpeg_duration(subclip_duration), subclip_name])
+            output_ranges[subclip_name] = (file_path, subclip_start, subclip_duration)
+        cut_jobs.append(CutJob(args, *output_ranges, output_ranges=output_ranges))
+
+    return run_cut_jobs(cut_jobs, cut_pool, progress, lambda result: record_cut_result(result, output_manifests))
+
+
+class BatchSession:
+    # Everything a command line run shares between its jobs: one set of exiftool workers, one open metadata cache,
+    # one cut pool, and every folder probed so far
+    def __init__(self, cut_workers=None):
+        self.et = exiftool.ExifToolPool()
+        self.cache = MetadataCache()
+        self.cache.open()
+        self.cut_pool = CutPool(cut_workers)
+        self.clip_groups = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.cut_pool.shutdown()
+        self.et.terminate()
+        self.cache.close()
+
+    def clip_group(self, directory, synchronize_index, offset):
+        # Synchronize indexes count clips in capture order
+        directory = os.path.abspath(directory)
+        if directory not in self.clip_groups:
+            self.clip_groups[directory] = VideoClipGroup(directory, et=self.et, cache=self.cache)
+        return self.clip_groups[directory].synchronized(synchronize_index, offset)
+
+    def forget(self, directories):
+        # Folders whose clips were renamed have to be listed again by the next job that uses them
+        for directory in directories:
+            self.clip_groups.pop(os.path.abspath(directory), None)
+
+    def sync_cut(self, angles, option='RENAME_AND_PAD'):
+        try:
+            sync_cut_clip_groups([self.clip_group(*angle) for angle in angles], option)
+        finally:
+            # Even a rename run that stopped partway has moved clips
+            if option == 'RENAME_AND_PAD':
+                self.forget(directory for directory, _, _ in angles)
+        return []
+
+    def auto_cut_secondary(self, base_angle, secondary_angles, cut_mode='COPY'):
+        return cut_secondary_clip_groups(self.clip_group(*base_angle),
+                                         [self.clip_group(*secondary_angle) for secondary_angle in secondary_angles],
+                                         self.cut_pool, cut_mode=cut_mode)
+
+    def subclip(self, file_path, marks, cut_mode='COPY'):
+        mark_time_pairs = [(to_ffmpeg_duration(start), to_ffmpeg_duration(end - start)) for start, end in marks]
+        return cut_clip_into_subclips(file_path, mark_time_pairs, self.cut_pool, cut_mode=cut_mode)
+
+
+def load_manifest(manifest_path):
+    # A manifest is {"cut_mode": ..., "jobs": [...]}; each job names its command and the same arguments as the
+    # matching subcommand, e.g.
+    #   {"command": "sync-cut", "angles": [["Game1/EndZone", 0, 0], ["Game1/Sideline", 0, 2]], "option": "COPY"}
+    #   {"command": "auto-cut-secondary", "base": ["Game1/EndZone", 0, 0], "secondaries": [["Game1/Sideline", 0, 2]]}
+    #   {"command": "subclip", "file": "Game1/EndZone/aic0001.MP4", "marks": [[12, 30], [45, 61.5]]}
+    # Relative paths are taken from the manifest's own folder.
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+    manifest_directory = os.path.dirname(os.path.abspath(manifest_path))
+    default_cut_mode = manifest.get('cut_mode', 'COPY')
+
+    def to_angle(angle):
+        directory, synchronize_index, offset = angle
+        return os.path.join(manifest_directory, directory), int(synchronize_index), float(offset)
+
+    jobs = []
+    for job in manifest['jobs']:
+        command = job['command']
+        cut_mode = job.get('cut_mode', default_cut_mode)
+        if command == 'sync-cut':
+            jobs.append((command, lambda session, job=job: session.sync_cut(
+                [to_angle(angle) for angle in job['angles']], job.get('option', 'RENAME_AND_PAD'))))
+        elif command == 'auto-cut-secondary':
+            jobs.append((command, lambda session, job=job, cut_mode=cut_mode: session.auto_cut_secondary(
+                to_angle(job['base']), [to_angle(angle) for angle in job['secondaries']], cut_mode)))
+        elif command == 'subclip':
+            jobs.append((command, lambda session, job=job, cut_mode=cut_mode: session.subclip(
+                os.path.join(manifest_directory, job['file']), [(float(start), float(end)) for start, end in job['marks']],
+                cut_mode)))
+        else:
+            raise ValueError(f'Unknown command {command!r} in {manifest_path}')
+    return jobs
+
+
+def run_batch_jobs(jobs, cut_workers=None):
+    # Runs every job even if an earlier one fails; returns whether they all succeeded
+    all_ok = True
+    with BatchSession(cut_workers) as session:
+        for i, (name, run_job) in enumerate(jobs):
+            print(f'[{i + 1}/{len(jobs)}] {name}', file=sys.stderr)
+            try:
+                if report_failed_cuts(run_job(session)):
+                    all_ok = False
+            except Exception as e:
+                # One bad folder shouldn't stop the rest of an overnight run
+                print(f'{name} failed: {type(e).__name__}: {e}', file=sys.stderr)
+                all_ok = False
+    return all_ok
+
+
+def parse_angle(values):
+    directory, synchronize_index, offset = values
+    return directory, int(synchronize_index), float(offset)
+
+
+def parse_mark(values):
+    start, end = (float(value) for value in values)
+    if end <= start:
+        raise argparse.ArgumentTypeError(f'mark ends before it starts: {start} {end}')
+    return start, end
+
+
+def build_arg_parser():
+    arg_parser = argparse.ArgumentParser(description='Sync, cut and subclip practice film without the GUI.')
+    arg_parser.add_argument('--trace', help='write a Chrome trace of every stage and child process to this file')
+    arg_parser.add_argument('--cut-workers', type=int,
+                            help=f'ffmpeg cuts run at once (default: ${CUT_WORKERS_ENV} if set, otherwise one per '
+                                 f'core up to {MAX_DEFAULT_CUT_WORKERS})')
+    subparsers = arg_parser.add_subparsers(dest='command', required=True)
+    angle_help = 'a camera folder, the capture-order index of its sync clip and its offset in seconds'
+
+    sync_cut_parser = subparsers.add_parser('sync-cut', help='rename or copy every angle\'s clips into synced order')
+    sync_cut_parser.add_argument('--angle', nargs=3, metavar=('DIRECTORY', 'INDEX', 'OFFSET'), action='append',
+                                 required=True, help=angle_help)
+    sync_cut_parser.add_argument('--option', choices=['RENAME_AND_PAD', 'COPY'], default='RENAME_AND_PAD')
+
+    auto_cut_parser = subparsers.add_parser('auto-cut-secondary',
+                                            help='cut secondary angles to match the base angle\'s clips')
+    auto_cut_parser.add_argument('--base', nargs=3, metavar=('DIRECTORY', 'INDEX', 'OFFSET'), required=True,
+                                 help=angle_help)
+    auto_cut_parser.add_argument('--secondary', nargs=3, metavar=('DIRECTORY', 'INDEX', 'OFFSET'), action='append',
+                                 required=True, help=angle_help)
+    auto_cut_parser.add_argument('--frame-accurate', action='store_true',
+                                 help='re-encode around each cut instead of snapping it to a keyframe')
+
+    subclip_parser = subparsers.add_parser('subclip', help='cut marked ranges of one clip into subclips')
+    subclip_parser.add_argument('file')
+    subclip_parser.add_argument('--mark', nargs=2, metavar=('START', 'END'), action='append', required=True,
+                                help='a range to cut, in seconds')
+    subclip_parser.add_argument('--frame-accurate', action='store_true',
+                                help='re-encode around each cut instead of snapping it to a keyframe')
+
+    manifest_parser = subparsers.add_parser('manifest', help='run every job listed in JSON manifests in one process')
+    manifest_parser.add_argument('manifests', nargs='+')
+    return arg_parser
+
+
+def run_legacy_command(argv):
+    # Parameter should be baseDirectory baseSynchronizeIndex baseOffset
+    # secondaryDirectory secondarySynchronizeIndex secondaryOffset option
+    base_directory = argv[0]
+    base_sync_index = int(argv[1])
+    base_offset = int(argv[2])
 
+    secondary_directory = argv[3]
+    secondary_sync_index = int(argv[4])
+    secondary_offset = int(argv[5])
 
+    option = argv[6]
 
+    if option.upper() == 'SYNC_CUT_DIRS':
+        auto_sync_cut_folders(base_directory, base_sync_index, base_offset,
+                              secondary_directory, secondary_sync_index, secondary_offset)
+    elif option.upper() == 'AUTO_CUT_SEC':
+        results = auto_cut_secondary(base_directory, base_sync_index, base_offset,
+                                     secondary_directory, secondary_sync_index, secondary_offset)
+        if report_failed_cuts(results):
+            sys.exit(1)
 
 
+def main(argv=None):
+    argv = sys.argv[1:] if argv == None else argv
+    if len(argv) == 7 and argv[6].upper() in LEGACY_OPTIONS:
+        run_legacy_command(argv)
+        return
 
+    args = build_arg_parser().parse_args(argv)
+    if args.trace:
+        tracing.enable(args.trace)
 
+    try:
+        if args.command == 'sync-cut':
+            angles = [parse_angle(angle) for angle in args.angle]
+            jobs = [('sync-cut', lambda session: session.sync_cut(angles, args.option))]
+        elif args.command == 'auto-cut-secondary':
+            base_angle = parse_angle(args.base)
+            secondary_angles = [parse_angle(angle) for angle in args.secondary]
+            cut_mode = 'SMART_RENDER' if args.frame_accurate else 'COPY'
+            jobs = [('auto-cut-secondary', lambda session: session.auto_cut_secondary(base_angle, secondary_angles,
+                                                                                      cut_mode))]
+        elif args.command == 'subclip':
+            marks = [parse_mark(mark) for mark in args.mark]
+            cut_mode = 'SMART_RENDER' if args.frame_accurate else 'COPY'
+            jobs = [('subclip', lambda session: session.subclip(args.file, marks, cut_mode))]
+        else:
+            jobs = [job for manifest_path in args.manifests for job in load_manifest(manifest_path)]
+    except (OSError, ValueError, KeyError, argparse.ArgumentTypeError) as e:
+        print(f'Incorrect arguments passed to autointercut: {e}', file=sys.stderr)
+        sys.exit(2)
 
+    if not run_batch_jobs(jobs, args.cut_workers):
+        sys.exit(1)
 
 
+if __name__ == '__main__':
+    main()
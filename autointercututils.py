@@ -1,14 +1,21 @@
-import copy
+import datetime
 import os
-import subprocess
 
 
-from dateutil import parser, relativedelta
+from dateutil import parser
+from clipheaders import read_clip_header
+from outputmanifest import get_placeholder_paths
 import exiftool
+import metadatacache
+import tracing
 
 
 SUPPORTED_EXTENSIONS = ['.MTS', '.MP4']
 DATETIME_TAGS = ['DateTimeOriginal', 'CreateDate']
+DURATION_TAG = 'Duration'
+METADATA_BATCH_SIZE = 200
+# Below this many clips per worker, starting another exiftool costs more than it saves
+METADATA_FILES_PER_WORKER = 25
 
 
 def to_ffmpeg_duration(duration):
@@ -28,65 +35,225 @@ def pairs(seq):
         j = next(it, None)
 
 
-def to_seconds(relative_delta):
-    return relative_delta.seconds + relative_delta.minutes * 60 + relative_delta.hours * 3600
+def to_epoch_seconds(clip_datetime):
+    # Camera datetimes usually carry no time zone; they're all read as UTC so differences between them stay exact
+    if clip_datetime.tzinfo == None:
+        clip_datetime = clip_datetime.replace(tzinfo=datetime.timezone.utc)
+    return clip_datetime.timestamp()
+
+
+def from_epoch_seconds(start):
+    return datetime.datetime.fromtimestamp(start, datetime.timezone.utc)
+
+
+class Clip:
+    # One row of the clip table. The probing stages fill in start (seconds since the epoch) and duration, and
+    # with_synchronized_time fills in synchronize_time, all in place.
+    __slots__ = ['file_path', 'start', 'duration', 'synchronize_time']
+
+    def __init__(self, file_path, start=None, duration=None, synchronize_time=None):
+        self.file_path = file_path
+        self.start = start
+        self.duration = duration
+        self.synchronize_time = synchronize_time
+
+    def __repr__(self):
+        return f'Clip({self.file_path!r}, {self.start!r}, {self.duration!r}, {self.synchronize_time!r})'
 
 
 def get_movie_file_paths(directory):
-    return [{'file_path': f'{os.path.join(directory, filename)}{file_extension}'}
+    # Blank placeholders a sync cut padded the folder with aren't camera clips
+    placeholder_paths = get_placeholder_paths(directory)
+    return [Clip(f'{os.path.join(directory, filename)}{file_extension}')
             for filename, file_extension in [os.path.splitext(item_path) for item_path in os.listdir(directory)]
-            if file_extension.upper() in SUPPORTED_EXTENSIONS]
+            if file_extension.upper() in SUPPORTED_EXTENSIONS
+            and f'{os.path.join(directory, filename)}{file_extension}' not in placeholder_paths]
 
 
-def with_datetime(movie_files):
-    movie_files = copy.deepcopy(movie_files)
+def chunks(seq, size):
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
 
-    with exiftool.ExifTool() as et:
+
+def normalize_path(file_path):
+    return os.path.normcase(os.path.abspath(file_path))
+
+
+def find_tag(metadata, tag):
+    for full_tag, value in metadata.items():
+        if full_tag.split(':')[-1] == tag:
+            return value
+    return None
+
+
+def get_tags_by_path(et, tags, file_paths):
+    # exiftool leaves out files it can't read, so results are matched on SourceFile rather than position
+    tags_by_path = {}
+    with tracing.span('exiftool', 'process', files=len(file_paths)):
+        results = et.get_tags_batch(tags, file_paths)
+    for metadata in results:
+        tags_by_path[normalize_path(metadata['SourceFile'])] = metadata
+    return tags_by_path
+
+
+def parse_datetime_tags(metadata, file_path):
+    for tag in DATETIME_TAGS:
+        datetime = find_tag(metadata, tag)
+        if datetime != None:
+            return parser.parse(datetime)
+    raise ValueError(f'Couldn\'t get a datetime for {file_path}')
+
+
+def parse_duration_tag(metadata):
+    duration = find_tag(metadata, DURATION_TAG)
+    if isinstance(duration, (int, float)) and duration > 0:
+        return float(duration)
+    return None
+
+
+@tracing.traced()
+def with_metadata(movie_files, use_cache=True, progress=None, et=None, cache=None):
+    # A running batch can share one exiftool pool and one open cache across calls; otherwise both are opened here
+    own_cache = cache == None and use_cache
+    if own_cache:
+        cache = metadatacache.MetadataCache()
+        cache.open()
+
+    try:
+        uncached_files = []
+        header_files = []
         for movie_file in movie_files:
-            metadata = et.get_tags(DATETIME_TAGS, movie_file['file_path'])
+            cached = cache.get(movie_file.file_path, os.stat(movie_file.file_path)) if cache else None
+            if not cached:
+                # Reading the container header is plain file I/O; exiftool is only started for what it can't read
+                cached = read_clip_header(movie_file.file_path)
+                if cached:
+                    header_files.append(movie_file)
+            if cached:
+                movie_file.start = to_epoch_seconds(cached[0])
+                movie_file.duration = cached[1]
+            else:
+                uncached_files.append(movie_file)
+
+        probed_count = len(movie_files) - len(uncached_files)
+        if progress:
+            progress.update('Probing clips', probed_count, len(movie_files))
+
+        if cache:
+            for movie_file in header_files:
+                cache.put(movie_file.file_path, os.stat(movie_file.file_path),
+                          from_epoch_seconds(movie_file.start), movie_file.duration)
+            # Lookups and header puts open a write transaction, which mustn't lock out other probes for as long as
+            # exiftool and ffprobe take
+            cache.commit()
 
-            for tag in DATETIME_TAGS:
-                datetime = None
-                for full_tag, value in metadata.items():
-                    if tag in full_tag:
-                        datetime = value
-                if datetime != None:
-                    break
+        if uncached_files:
+            tags_by_path = {}
+            worker_count = min(os.cpu_count() or 1, -(-len(uncached_files) // METADATA_FILES_PER_WORKER))
+            pool = et or exiftool.ExifToolPool(worker_count)
+            if not pool.running:
+                pool.start()
+            try:
+                for batch in chunks(uncached_files, METADATA_BATCH_SIZE * pool.size):
+                    if progress:
+                        progress.check_cancelled()
+                    tags_by_path.update(get_tags_by_path(pool, DATETIME_TAGS + [DURATION_TAG],
+                                                         [movie_file.file_path for movie_file in batch]))
+                    probed_count += len(batch)
+                    if progress:
+                        progress.update('Probing clips', probed_count, len(movie_files))
+            finally:
+                if et == None:
+                    pool.terminate()
 
-            if datetime == None:
-                raise ValueError('Couldn\'t get a datetime for {movie_file["file_path"]}')
+            for movie_file in uncached_files:
+                metadata = tags_by_path.get(normalize_path(movie_file.file_path), {})
+                movie_file.start = to_epoch_seconds(parse_datetime_tags(metadata, movie_file.file_path))
+                movie_file.duration = parse_duration_tag(metadata)
 
-            movie_file['datetime'] = parser.parse(datetime)
+            # Only clips exiftool couldn't time are handed to ffprobe
+            probe_durations(uncached_files, progress)
+
+            if cache:
+                for movie_file in uncached_files:
+                    cache.put(movie_file.file_path, os.stat(movie_file.file_path),
+                              from_epoch_seconds(movie_file.start), movie_file.duration)
+    finally:
+        if own_cache:
+            cache.close()
+        elif cache:
+            cache.commit()
     return movie_files
 
 
-def with_duration(movie_files):
-    movie_files = copy.deepcopy(movie_files)
+def with_datetime(movie_files):
+    unread_files = []
     for movie_file in movie_files:
-        cmd = ['ffprobe', '-i', movie_file['file_path'], '-show_entries', 'format=duration', '-v', 'quiet', '-of', 'csv=%s' % ("p=0")]
-        duration = subprocess.check_output(cmd)
+        header = read_clip_header(movie_file.file_path)
+        if header:
+            movie_file.start = to_epoch_seconds(header[0])
+        else:
+            unread_files.append(movie_file)
+    if not unread_files:
+        return movie_files
+
+    with exiftool.ExifTool() as et:
+        tags_by_path = get_tags_by_path(et, DATETIME_TAGS, [movie_file.file_path for movie_file in unread_files])
+
+    for movie_file in unread_files:
+        metadata = tags_by_path.get(normalize_path(movie_file.file_path), {})
+        movie_file.start = to_epoch_seconds(parse_datetime_tags(metadata, movie_file.file_path))
+    return movie_files
+
+
+def probe_durations(movie_files, progress=None):
+    for movie_file in movie_files:
+        if movie_file.duration != None:
+            continue
+        if progress:
+            progress.check_cancelled()
+        cmd = ['ffprobe', '-i', movie_file.file_path, '-show_entries', 'format=duration', '-v', 'quiet', '-of', 'csv=%s' % ("p=0")]
+        duration = tracing.check_output(cmd)
         duration = float(duration)
-        movie_file['duration'] = duration
+        movie_file.duration = duration
+
+
+def with_duration(movie_files):
+    for movie_file in movie_files:
+        if movie_file.duration == None:
+            header = read_clip_header(movie_file.file_path)
+            if header:
+                movie_file.duration = header[1]
+    probe_durations(movie_files)
     return movie_files
 
 
-def with_synchronized_time(movie_files, synchronize_datetime, offset):
-    movie_files = copy.deepcopy(movie_files)
+@tracing.traced()
+def with_synchronized_time(movie_files, synchronize_start, offset):
+    # An empty folder has nothing to synchronize on
+    if not movie_files or synchronize_start == None:
+        return movie_files
+    origin = synchronize_start + offset
     for movie_file in movie_files:
-        rd = to_seconds(relativedelta.relativedelta(movie_file['datetime'], synchronize_datetime))
-        movie_file['synchronize_time'] = rd - offset
+        movie_file.synchronize_time = movie_file.start - origin
     return movie_files
 
 
 def do_times_overlap(movie_file_1, movie_file_2):
-    if movie_file_1['synchronize_time'] < movie_file_2['synchronize_time']:
-        return movie_file_1['synchronize_time'] + movie_file_1['duration'] > movie_file_2['synchronize_time']
+    if movie_file_1.synchronize_time < movie_file_2.synchronize_time:
+        return movie_file_1.synchronize_time + movie_file_1.duration > movie_file_2.synchronize_time
     else:
-        return movie_file_2['synchronize_time'] + movie_file_2['duration'] > movie_file_1['synchronize_time']
+        return movie_file_2.synchronize_time + movie_file_2.duration > movie_file_1.synchronize_time
 
 
 def to_ffmpeg_duration(duration):
     hours = int(duration // 3600)
     minutes = int((duration - (hours * 3600)) // 60)
     seconds = duration % 60
-    return f'{hours}:{minutes}:{seconds}'
\ No newline at end of file
+    return f'{hours}:{minutes}:{seconds}'
+
+def from_ffmpeg_duration(duration):
+    seconds = 0
+    for component in str(duration).split(':'):
+        seconds = seconds * 60 + float(component)
+    return seconds
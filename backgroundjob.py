@@ -0,0 +1,103 @@
+import queue
+import threading
+import time
+
+
+POLL_INTERVAL_MS = 100
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobProgress:
+    # Shared between a worker thread, which reports into it, and the Tk thread, which polls and cancels it
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cancel_event = threading.Event()
+        self.stage = ''
+        self.done = 0
+        self.total = 0
+        self.bytes_done = 0
+        self.stage_started_at = time.monotonic()
+
+    def update(self, stage, done, total):
+        with self.lock:
+            if stage != self.stage:
+                self.stage = stage
+                self.bytes_done = 0
+                self.stage_started_at = time.monotonic()
+            self.done = done
+            self.total = total
+
+    def add_bytes(self, byte_count):
+        with self.lock:
+            self.bytes_done += byte_count
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def describe(self):
+        with self.lock:
+            if not self.stage:
+                return ''
+            description = f'{self.stage} {self.done}/{self.total}'
+            elapsed = time.monotonic() - self.stage_started_at
+            if self.bytes_done and elapsed > 0:
+                description += f' ({self.bytes_done / elapsed / 10 ** 6:.1f} MB/s)'
+            return description
+
+
+class BackgroundJob:
+    # Runs target(progress) on a worker thread and hands its result back to Tk by polling with after()
+    def __init__(self, widget, target, on_done=None, on_error=None, on_progress=None):
+        self.widget = widget
+        self.target = target
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.progress = JobProgress()
+        self.results = queue.Queue()
+        self.thread = None
+        self.finished = False
+
+    @property
+    def running(self):
+        return self.thread != None and not self.finished
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        self.widget.after(POLL_INTERVAL_MS, self.poll)
+        return self
+
+    def run(self):
+        try:
+            self.results.put((True, self.target(self.progress)))
+        except Exception as e:
+            self.results.put((False, e))
+
+    def cancel(self):
+        self.progress.cancel()
+
+    def poll(self):
+        if self.on_progress:
+            self.on_progress(self.progress.describe())
+        try:
+            succeeded, result = self.results.get_nowait()
+        except queue.Empty:
+            self.widget.after(POLL_INTERVAL_MS, self.poll)
+            return
+        self.finished = True
+        if succeeded and self.on_done:
+            self.on_done(result)
+        elif not succeeded and self.on_error:
+            self.on_error(result)
@@ -0,0 +1,164 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from fractions import Fraction
+
+import metadatacache
+import tracing
+from autointercut import VideoClipGroup, get_synchronized_grouping, auto_sync_cut_folders, auto_cut_secondary
+from clipdecoder import ClipDecoder, preview_size
+from framecache import extract_frame
+
+
+CLIP_WIDTH = 640
+CLIP_HEIGHT = 360
+CLIP_FRAME_RATE = 30
+CLIP_GAP_SECONDS = 20
+PREVIEW_SEEKS = 10
+ANGLES = [('base', 0), ('secondary', 1)]
+
+
+def generate_clip(file_path, creation_time, duration):
+    subprocess.check_call(['ffmpeg', '-y', '-v', 'error',
+                           '-f', 'lavfi', '-i', f'testsrc=size={CLIP_WIDTH}x{CLIP_HEIGHT}:rate={CLIP_FRAME_RATE}',
+                           '-f', 'lavfi', '-i', 'sine=frequency=440',
+                           '-t', str(duration),
+                           '-c:v', 'libx264', '-preset', 'ultrafast', '-g', str(CLIP_FRAME_RATE),
+                           '-c:a', 'aac',
+                           '-metadata', f'creation_time={creation_time.isoformat()}',
+                           file_path])
+
+
+def generate_angle_folder(directory, clip_count, clip_seconds, start_offset):
+    # Folders are reused between runs as long as they hold the expected number of clips
+    if os.path.isdir(directory) and len([name for name in os.listdir(directory) if name.endswith('.MP4')]) == clip_count:
+        return
+    os.makedirs(directory, exist_ok=True)
+    start_time = datetime.datetime(2019, 1, 1, 9, 0, 0, tzinfo=datetime.timezone.utc)
+    for i in range(clip_count):
+        creation_time = start_time + datetime.timedelta(seconds=i * (clip_seconds + CLIP_GAP_SECONDS) + start_offset)
+        generate_clip(os.path.join(directory, f'C{i:04d}.MP4'), creation_time, clip_seconds)
+
+
+def remove_output_directories(directories):
+    # The cut stages skip outputs their folder's manifest records as done, so each one starts from an empty output/
+    # folder or every run after the first would time a no-op
+    for directory in directories:
+        shutil.rmtree(os.path.join(directory, 'output'), ignore_errors=True)
+
+
+def timed(results, clip_count, stage, function, *args, **kwargs):
+    started_at = time.perf_counter()
+    value = function(*args, **kwargs)
+    seconds = time.perf_counter() - started_at
+    results.append({'clips': clip_count, 'stage': stage, 'seconds': seconds})
+    print(f'{clip_count:>6} clips  {stage:<28} {seconds:10.3f}s', file=sys.stderr)
+    return value
+
+
+def preview_with_extract_frame(clip_path):
+    for seek_time in range(PREVIEW_SEEKS):
+        extract_frame(clip_path, seek_time, *preview_size(CLIP_WIDTH, CLIP_HEIGHT))
+
+
+def preview_with_decoder(clip_path):
+    decoder = ClipDecoder(clip_path, *preview_size(CLIP_WIDTH, CLIP_HEIGHT), Fraction(CLIP_FRAME_RATE))
+    try:
+        for seek_time in range(PREVIEW_SEEKS):
+            decoder.frame_at(seek_time)
+    finally:
+        decoder.close()
+
+
+def benchmark_size(work_directory, clip_count, clip_seconds, results):
+    directories = {}
+    for angle, start_offset in ANGLES:
+        directories[angle] = os.path.join(work_directory, f'{clip_count}', angle)
+        timed(results, clip_count, f'generate_{angle}', generate_angle_folder,
+              directories[angle], clip_count, clip_seconds, start_offset)
+
+    # Every size starts with an empty metadata cache so the first probe is cold
+    os.environ[metadatacache.CACHE_DIRECTORY_ENV] = tempfile.mkdtemp(prefix='aic_bench_cache_')
+    timed(results, clip_count, 'probe_cold', VideoClipGroup, directories['base'])
+    base_clip_group = timed(results, clip_count, 'probe_warm', VideoClipGroup, directories['base'])
+    secondary_clip_group = VideoClipGroup(directories['secondary'])
+
+    timed(results, clip_count, 'get_synchronized_grouping', get_synchronized_grouping,
+          base_clip_group, secondary_clip_group)
+    remove_output_directories(directories.values())
+    timed(results, clip_count, 'auto_sync_cut_folders_copy', auto_sync_cut_folders,
+          directories['base'], 0, 0, directories['secondary'], 0, 0, 'COPY')
+    remove_output_directories(directories.values())
+    timed(results, clip_count, 'auto_cut_secondary', auto_cut_secondary,
+          directories['base'], 0, 0, directories['secondary'], 0, 0)
+
+    clip_path = base_clip_group.clips[0].file_path
+    timed(results, clip_count, 'preview_extract_frame', preview_with_extract_frame, clip_path)
+    timed(results, clip_count, 'preview_decoder', preview_with_decoder, clip_path)
+    remove_output_directories(directories.values())
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(baseline_path, results):
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+    baseline_seconds = {(result['clips'], result['stage']): result['seconds'] for result in baseline['results']}
+    print(f'Compared with {baseline.get("commit")}:', file=sys.stderr)
+    for result in results:
+        previous_seconds = baseline_seconds.get((result['clips'], result['stage']))
+        if previous_seconds:
+            print(f'{result["clips"]:>6} clips  {result["stage"]:<28} {previous_seconds:10.3f}s -> '
+                  f'{result["seconds"]:10.3f}s ({result["seconds"] / previous_seconds:5.2f}x)', file=sys.stderr)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Time the probe, match, cut and preview stages on synthetic '
+                                                     'camera folders.')
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000],
+                            help='clip counts per camera folder')
+    arg_parser.add_argument('--clip-seconds', type=int, default=12, help='length of each generated clip')
+    arg_parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'aic_benchmark'),
+                            help='where synthetic folders are generated and kept between runs')
+    arg_parser.add_argument('--output', default='benchmark_results.json', help='JSON file the timings are written to')
+    arg_parser.add_argument('--trace', help='also write a Chrome trace of every stage and child process to this file')
+    arg_parser.add_argument('--baseline', help='results JSON of an earlier run to compare the timings with')
+    args = arg_parser.parse_args(argv)
+    if args.trace:
+        tracing.enable(args.trace)
+
+    results = []
+    for clip_count in args.sizes:
+        benchmark_size(args.work_dir, clip_count, args.clip_seconds, results)
+
+    report = {
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'clip_seconds': args.clip_seconds,
+        'results': results,
+    }
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+
+    if args.baseline:
+        compare_results(args.baseline, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+import subprocess
+import threading
+import time
+from fractions import Fraction
+
+import tracing
+from autointercututils import to_ffmpeg_duration
+
+
+# Reading forward through this many seconds of frames is cheaper than restarting ffmpeg and seeking
+MAX_READ_AHEAD_SECONDS = 6
+PREVIEW_WIDTH = 640
+
+
+def parse_frame_rate(frame_rate):
+    frame_rate = Fraction(frame_rate)
+    return frame_rate if frame_rate > 0 else Fraction(30)
+
+
+def preview_size(width, height):
+    return PREVIEW_WIDTH, max(2, round(PREVIEW_WIDTH * height / width / 2) * 2)
+
+
+def ppm_header(width, height):
+    # Matches the header ffmpeg's ppm encoder writes for rgb24 frames
+    return f'P6\n{width} {height}\n255\n'.encode('ascii')
+
+
+def scale_filter(width, height):
+    return f'scale={width}:{height}:flags=bilinear'
+
+
+class ClipDecoder:
+    # One long-lived ffmpeg streaming PPM frames, already scaled to width x height, for a clip.
+    # Forward seeks read ahead instead of restarting.
+    def __init__(self, clip_path, width, height, frame_rate):
+        self.clip_path = clip_path
+        self.width = width
+        self.height = height
+        self.frame_rate = frame_rate
+        self.frame_size = len(ppm_header(width, height)) + width * height * 3
+        self.process = None
+        self.process_span = tracing.NULL_SPAN
+        self.start_time = 0
+        self.frames_read = 0
+        self.lock = threading.Lock()
+
+    @property
+    def position(self):
+        return self.start_time + float(self.frames_read / self.frame_rate)
+
+    def open(self, start_time):
+        self.close()
+        command = ['ffmpeg',
+                   '-ss', to_ffmpeg_duration(start_time),
+                   '-i', self.clip_path,
+                   '-an',
+                   '-vf', scale_filter(self.width, self.height),
+                   '-r', f'{self.frame_rate.numerator}/{self.frame_rate.denominator}',
+                   '-f', 'image2pipe',
+                   '-vcodec', 'ppm',
+                   '-pix_fmt', 'rgb24',
+                   '-']
+        # The span covers the whole decoder session, from spawn to close
+        self.process_span = tracing.process_span(command, start_time=start_time).__enter__()
+        self.process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL, bufsize=self.frame_size)
+        self.start_time = start_time
+        self.frames_read = 0
+
+    def close(self):
+        if self.process == None:
+            return
+        self.process.kill()
+        self.process.stdout.close()
+        self.process.wait()
+        self.process = None
+        self.process_span.set(frames=self.frames_read, bytes_out=self.frames_read * self.frame_size)
+        self.process_span.__exit__(None, None, None)
+        self.process_span = tracing.NULL_SPAN
+
+    def read_frame(self):
+        with self.lock:
+            return self._read_frame()
+
+    def _read_frame(self):
+        if self.process == None:
+            return None
+        frame = self.process.stdout.read(self.frame_size)
+        if len(frame) < self.frame_size:
+            self.close()
+            return None
+        self.frames_read += 1
+        return frame
+
+    @tracing.traced('decode_frame')
+    def frame_at(self, seek_time):
+        with self.lock:
+            frames_ahead = round((seek_time - self.position) * self.frame_rate)
+            if self.process == None or frames_ahead < 0 or seek_time - self.position > MAX_READ_AHEAD_SECONDS:
+                self.open(seek_time)
+                frames_ahead = 0
+            for _ in range(frames_ahead):
+                if self._read_frame() == None:
+                    break
+            frame = self._read_frame()
+        if frame == None:
+            raise subprocess.CalledProcessError(1, 'ffmpeg', f'No frame at {seek_time} in {self.clip_path}')
+        return frame
+
+
+class ClipPlayback:
+    # Plays a decoder back on the Tk event loop, dropping frames when display falls behind the wall clock
+    def __init__(self, widget, decoder, show_frame, on_stop=None):
+        self.widget = widget
+        self.decoder = decoder
+        self.show_frame = show_frame
+        self.on_stop = on_stop
+        self.speed = 1
+        self.after_id = None
+        self.started_at = None
+        self.frames_shown = 0
+
+    @property
+    def playing(self):
+        return self.after_id != None
+
+    def start(self, start_time, speed=1):
+        self.stop()
+        with self.decoder.lock:
+            if self.decoder.process == None or abs(self.decoder.position - start_time) > 1 / self.decoder.frame_rate:
+                self.decoder.open(start_time)
+        self.speed = speed
+        self.started_at = time.monotonic()
+        self.frames_shown = 0
+        self.tick()
+
+    def stop(self):
+        if self.after_id == None:
+            return
+        self.widget.after_cancel(self.after_id)
+        self.after_id = None
+        if self.on_stop:
+            self.on_stop(self.decoder.position)
+
+    def tick(self):
+        self.after_id = None
+        target_frames = int((time.monotonic() - self.started_at) * self.speed * self.decoder.frame_rate) + 1
+        frame = None
+        while self.frames_shown < target_frames:
+            frame = self.decoder.read_frame()
+            if frame == None:
+                if self.on_stop:
+                    self.on_stop(self.decoder.position)
+                return
+            self.frames_shown += 1
+        if frame != None:
+            self.show_frame(frame)
+        frame_interval = 1 / (self.decoder.frame_rate * self.speed)
+        self.after_id = self.widget.after(max(1, int(frame_interval * 1000)), self.tick)
@@ -0,0 +1,187 @@
+import datetime
+import os
+import struct
+
+
+# Seconds between the QuickTime epoch (1904-01-01) and the Unix epoch
+QUICKTIME_EPOCH_OFFSET = 2082844800
+TS_PACKET_SIZE = 188
+# AVCHD .MTS packets carry a 4-byte arrival timestamp in front of each transport stream packet
+MTS_PACKET_SIZE = 192
+TS_SYNC_BYTE = 0x47
+PTS_CLOCK_RATE = 90000
+PTS_WRAP = 1 << 33
+# The first access unit (with the recording date) and a few frames' worth of PTS at each end
+MTS_HEAD_SCAN_BYTES = 512 * 1024
+MTS_TAIL_SCAN_BYTES = 256 * 1024
+MDPM_UUID = bytes.fromhex('17ee8c60f84d11d98cd60800200c9a66') + b'MDPM'
+MDPM_DATE_TAG = 0x18
+MDPM_TIME_TAG = 0x19
+
+
+def read_box_header(file, end):
+    # Returns (box type, payload start, box end) of the box at the file's position, or None past the last box
+    start = file.tell()
+    if start + 8 > end:
+        return None
+    size, box_type = struct.unpack('>I4s', file.read(8))
+    if size == 1:
+        size = struct.unpack('>Q', file.read(8))[0]
+    elif size == 0:
+        size = end - start
+    if size < 8:
+        return None
+    return box_type, file.tell(), start + size
+
+
+def find_box(file, path, end):
+    # Walks down path (e.g. [b'moov', b'mvhd']) seeking from box to box, so only box headers are read
+    while path:
+        box = read_box_header(file, end)
+        if box == None:
+            return None
+        box_type, payload_start, box_end = box
+        if box_type == path[0]:
+            path = path[1:]
+            end = box_end
+            if path:
+                file.seek(payload_start)
+        else:
+            file.seek(box_end)
+    return end
+
+
+def read_mp4_header(file):
+    file_size = os.fstat(file.fileno()).st_size
+    if find_box(file, [b'moov', b'mvhd'], file_size) == None:
+        return None
+    version = file.read(4)[0]
+    if version == 1:
+        creation_time, _, timescale, duration = struct.unpack('>QQIQ', file.read(28))
+        unknown_duration = 0xffffffffffffffff
+    else:
+        creation_time, _, timescale, duration = struct.unpack('>IIII', file.read(16))
+        unknown_duration = 0xffffffff
+    # A zero or all-ones duration means the writer didn't know it (e.g. a recording cut short), so exiftool and
+    # ffprobe are left to work it out
+    if creation_time == 0 or timescale == 0 or duration in (0, unknown_duration):
+        return None
+    # Stored as seconds since 1904 without a time zone, which is also how exiftool reports it
+    clip_datetime = datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=creation_time - QUICKTIME_EPOCH_OFFSET)
+    return clip_datetime, duration / timescale
+
+
+def iter_ts_payloads(data, packet_size):
+    # Yields (pid, payload_unit_start, payload) for each transport stream packet in data
+    offset = packet_size - TS_PACKET_SIZE
+    for packet_start in range(offset, len(data) - TS_PACKET_SIZE + 1, packet_size):
+        if data[packet_start] != TS_SYNC_BYTE:
+            continue
+        pid = ((data[packet_start + 1] & 0x1f) << 8) | data[packet_start + 2]
+        payload_unit_start = bool(data[packet_start + 1] & 0x40)
+        adaptation_field_control = (data[packet_start + 3] >> 4) & 0x3
+        payload_start = packet_start + 4
+        if adaptation_field_control & 0x2:
+            payload_start += 1 + data[payload_start]
+        if adaptation_field_control & 0x1 and payload_start < packet_start + TS_PACKET_SIZE:
+            yield pid, payload_unit_start, data[payload_start:packet_start + TS_PACKET_SIZE]
+
+
+def parse_pes_pts(payload):
+    # PTS of a video PES header, or None if payload doesn't start one
+    if len(payload) < 14 or payload[:3] != b'\x00\x00\x01' or not 0xe0 <= payload[3] <= 0xef:
+        return None
+    if not payload[7] & 0x80:
+        return None
+    pts_bytes = payload[9:14]
+    return (((pts_bytes[0] >> 1) & 0x07) << 30 | pts_bytes[1] << 22 | (pts_bytes[2] >> 1) << 15
+            | pts_bytes[3] << 7 | pts_bytes[4] >> 1)
+
+
+def get_pts_values(data, packet_size):
+    return [pts for _, payload_unit_start, payload in iter_ts_payloads(data, packet_size)
+            if payload_unit_start for pts in [parse_pes_pts(payload)] if pts != None]
+
+
+def pts_since(pts, reference_pts):
+    # Signed distance from reference_pts, taking wraparound into account
+    return (pts - reference_pts + PTS_WRAP // 2) % PTS_WRAP - PTS_WRAP // 2
+
+
+def from_bcd(value):
+    return (value >> 4) * 10 + (value & 0x0f)
+
+
+def parse_mdpm_datetime(data):
+    # Recording date and time the camera writes into an H.264 SEI message (tags 0x18 and 0x19, BCD coded)
+    mdpm_start = data.find(MDPM_UUID)
+    if mdpm_start < 0:
+        return None
+    mdpm = data[mdpm_start + len(MDPM_UUID):mdpm_start + len(MDPM_UUID) + 1024].replace(b'\x00\x00\x03', b'\x00\x00')
+    tags = {}
+    for i in range(mdpm[0] if mdpm else 0):
+        entry = mdpm[1 + i * 5:6 + i * 5]
+        if len(entry) == 5:
+            tags[entry[0]] = entry[1:]
+    if MDPM_DATE_TAG not in tags or MDPM_TIME_TAG not in tags:
+        return None
+    time_zone, year_high, year_low, month = tags[MDPM_DATE_TAG]
+    day, hour, minute, second = tags[MDPM_TIME_TAG]
+    try:
+        clip_datetime = datetime.datetime(from_bcd(year_high) * 100 + from_bcd(year_low), from_bcd(month),
+                                          from_bcd(day), from_bcd(hour), from_bcd(minute), from_bcd(second))
+    except ValueError:
+        return None
+    if time_zone != 0xff:
+        # Bit 5 is the sign, bits 1-4 the hours and bit 0 adds half an hour
+        offset = datetime.timedelta(hours=(time_zone >> 1) & 0x0f, minutes=30 if time_zone & 0x01 else 0)
+        clip_datetime = clip_datetime.replace(tzinfo=datetime.timezone(-offset if time_zone & 0x20 else offset))
+    return clip_datetime
+
+
+def read_mts_header(file):
+    file_size = os.fstat(file.fileno()).st_size
+    head = file.read(min(file_size, MTS_HEAD_SCAN_BYTES))
+    packet_size = MTS_PACKET_SIZE if len(head) > MTS_PACKET_SIZE and head[4] == TS_SYNC_BYTE else TS_PACKET_SIZE
+    first_pts_values = get_pts_values(head, packet_size)
+    if not first_pts_values:
+        return None
+
+    # The tail is read from a packet boundary so packets line up the same way as from the start of the file
+    tail_start = max(0, (file_size - MTS_TAIL_SCAN_BYTES) // packet_size * packet_size)
+    file.seek(tail_start)
+    last_pts_values = get_pts_values(file.read(), packet_size)
+    if not last_pts_values:
+        return None
+
+    clip_datetime = parse_mdpm_datetime(b''.join(payload for _, _, payload in iter_ts_payloads(head, packet_size)))
+    if clip_datetime == None:
+        return None
+    # PTS wraps every 26.5 hours, so everything is measured from the first packet's PTS
+    reference_pts = first_pts_values[0]
+    first_pts_offsets = sorted(pts_since(pts, reference_pts) for pts in first_pts_values)
+    last_pts = max(pts_since(pts, reference_pts) for pts in last_pts_values)
+    # The last PTS is when the last frame starts, so one frame's duration is added to reach the end of the clip
+    frame_durations = [later - earlier for earlier, later in zip(first_pts_offsets, first_pts_offsets[1:])
+                       if later > earlier]
+    frame_duration = min(frame_durations) if frame_durations else 0
+    duration = last_pts + frame_duration - first_pts_offsets[0]
+    if duration <= 0:
+        return None
+    return clip_datetime, duration / PTS_CLOCK_RATE
+
+
+HEADER_READERS = {'.MP4': read_mp4_header, '.MTS': read_mts_header}
+
+
+def read_clip_header(file_path):
+    # Returns (datetime, duration in seconds) read straight from the container, or None when the clip isn't a
+    # format this understands or lacks either value, in which case exiftool and ffprobe are used instead
+    reader = HEADER_READERS.get(os.path.splitext(file_path)[1].upper())
+    if reader == None:
+        return None
+    try:
+        with open(file_path, 'rb') as file:
+            return reader(file)
+    except (OSError, struct.error, IndexError, ValueError, OverflowError):
+        return None
@@ -0,0 +1,158 @@
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import tracing
+
+
+CUT_WORKERS_ENV = 'AUTOINTERCUT_CUT_WORKERS'
+# Stream copies are mostly disk bound, so more workers than this just thrash a single card or drive
+MAX_DEFAULT_CUT_WORKERS = 8
+CANCEL_POLL_SECONDS = 0.2
+
+
+def default_cut_workers():
+    if os.environ.get(CUT_WORKERS_ENV):
+        return max(1, int(os.environ[CUT_WORKERS_ENV]))
+    return max(1, min(os.cpu_count() or 1, MAX_DEFAULT_CUT_WORKERS))
+
+
+class CutJob:
+    # A job may write several outputs when one ffmpeg pass cuts many ranges from the same source, and may run
+    # further commands after args (e.g. joining smart-rendered parts). scratch_files maps paths to text written when
+    # the job starts; they and scratch_paths are removed once it ends. output_ranges maps each output path to the
+    # (source path, start, duration) it is cut from.
+    def __init__(self, args, *output_paths, follow_up_commands=(), scratch_paths=(), scratch_files=None,
+                 output_ranges=None):
+        self.args = args
+        self.commands = [args] + list(follow_up_commands)
+        self.output_paths = list(output_paths)
+        self.output_path = self.output_paths[0]
+        self.scratch_files = scratch_files or {}
+        self.scratch_paths = list(scratch_paths) + list(self.scratch_files)
+        self.output_ranges = output_ranges or {}
+        self.process = None
+        self.killed = False
+        self.lock = threading.Lock()
+
+
+class CutResult:
+    def __init__(self, job, returncode, stderr):
+        self.job = job
+        self.returncode = returncode
+        self.stderr = stderr
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+
+def get_output_size(job):
+    return sum(os.path.getsize(output_path) for output_path in job.output_paths if os.path.exists(output_path))
+
+
+def run_cut_job(job):
+    try:
+        # ffmpeg -y truncates an existing output in place, which would also empty any file sharing its inode (an
+        # output hardlinked to its source by an older version, say), so stale outputs are unlinked first
+        for output_path in job.output_paths:
+            if os.path.lexists(output_path):
+                os.remove(output_path)
+        for scratch_path, contents in job.scratch_files.items():
+            with open(scratch_path, 'w') as scratch_file:
+                scratch_file.write(contents)
+        for command in job.commands:
+            with job.lock:
+                if job.killed:
+                    return CutResult(job, None, '')
+                job.process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                               stderr=subprocess.PIPE)
+            with tracing.process_span(command) as process_span:
+                _, stderr = job.process.communicate()
+                process_span.set(exit_status=job.process.returncode)
+                if tracing.enabled:
+                    process_span.set(bytes_out=get_output_size(job))
+            if job.process.returncode != 0:
+                break
+        return CutResult(job, job.process.returncode, stderr.decode('utf-8', 'replace'))
+    finally:
+        remove_scratch_files(job)
+
+
+def remove_scratch_files(job):
+    for scratch_path in job.scratch_paths:
+        try:
+            os.remove(scratch_path)
+        except FileNotFoundError:
+            pass
+
+
+def kill_cut_job(job):
+    with job.lock:
+        job.killed = True
+    if job.process and job.process.poll() == None:
+        job.process.kill()
+        job.process.wait()
+        # Whatever ffmpeg managed to write before being killed is unusable
+        for output_path in job.output_paths:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+    remove_scratch_files(job)
+
+
+class CutPool:
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or default_cut_workers()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+    @tracing.traced('cut_jobs')
+    def run(self, jobs, progress=None, on_result=None):
+        # Results come back in job order whatever order the ffmpeg processes finish in. on_result is also called
+        # with each one as soon as it finishes, on the calling thread.
+        futures = [self.executor.submit(run_cut_job, job) for job in jobs]
+        pending = set(futures)
+        if progress:
+            progress.update('Cutting', 0, len(jobs))
+        while pending:
+            finished, pending = wait(pending, timeout=CANCEL_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            if progress and progress.cancelled:
+                for future in futures:
+                    future.cancel()
+                for job in jobs:
+                    kill_cut_job(job)
+                progress.check_cancelled()
+            for future in finished:
+                if on_result:
+                    on_result(future.result())
+                if progress:
+                    progress.add_bytes(get_output_size(future.result().job))
+            if progress:
+                progress.update('Cutting', len(jobs) - len(pending), len(jobs))
+        return [future.result() for future in futures]
+
+
+def run_cut_jobs(jobs, cut_pool=None, progress=None, on_result=None):
+    if cut_pool:
+        return cut_pool.run(jobs, progress, on_result)
+    with CutPool() as cut_pool:
+        return cut_pool.run(jobs, progress, on_result)
+
+
+def report_failed_cuts(results, file=None):
+    file = file or sys.stderr
+    failed_results = [result for result in results if not result.ok]
+    for result in failed_results:
+        print(f'Cut failed for {", ".join(result.job.output_paths)} (exit code {result.returncode}):\n{result.stderr}',
+              file=file)
+    return failed_results
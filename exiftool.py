@@ -61,6 +61,8 @@ import os
 import json
 import warnings
 import codecs
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 try:        # Py3k compatibility
     basestring
@@ -81,7 +83,12 @@ sentinel = b"{ready}"
 # The block size when reading from exiftool.  The standard value
 # should be fine, though other values might give better performance in
 # some cases.
-block_size = 4096
+block_size = 65536
+
+# Number of trailing output bytes inspected for the sentinel.  Only
+# this much of the previous output needs to be kept around while
+# scanning new data, since the sentinel may be split across reads.
+_sentinel_window = 32
 
 # This code has been adapted from Lib/os.py in the Python source tree
 # (sha1 265e36e277f3)
@@ -112,6 +119,22 @@ def _fscodec():
 fsencode = _fscodec()
 del _fscodec
 
+def _strip_sentinel(output):
+    return output.strip()[:-len(sentinel)]
+
+def _encode_tag_params(tags, filenames):
+    # Explicitly ruling out strings here because passing in a
+    # string would lead to strange and hard-to-find errors
+    if isinstance(tags, basestring):
+        raise TypeError("The argument 'tags' must be "
+                        "an iterable of strings")
+    if isinstance(filenames, basestring):
+        raise TypeError("The argument 'filenames' must be "
+                        "an iterable of strings")
+    params = ["-" + t for t in tags]
+    params.extend(filenames)
+    return params
+
 class ExifTool(object):
     """Run the `exiftool` command-line tool and communicate to it.
 
@@ -220,11 +243,16 @@ class ExifTool(object):
             raise ValueError("ExifTool instance not running.")
         self._process.stdin.write(b"\n".join(params + (b"-execute\n",)))
         self._process.stdin.flush()
-        output = b""
+        chunks = []
+        tail = b""
         fd = self._process.stdout.fileno()
-        while not output[-32:].strip().endswith(sentinel):
-            output += os.read(fd, block_size)
-        return output.strip()[:-len(sentinel)]
+        while not tail.strip().endswith(sentinel):
+            chunk = os.read(fd, block_size)
+            if not chunk:
+                raise IOError("exiftool exited before finishing the command.")
+            chunks.append(chunk)
+            tail = (tail + chunk)[-_sentinel_window:]
+        return _strip_sentinel(b"".join(chunks))
 
     def execute_json(self, *params):
         """Execute the given batch of parameters and parse the JSON output.
@@ -278,17 +306,7 @@ class ExifTool(object):
         The format of the return value is the same as for
         :py:meth:`execute_json()`.
         """
-        # Explicitly ruling out strings here because passing in a
-        # string would lead to strange and hard-to-find errors
-        if isinstance(tags, basestring):
-            raise TypeError("The argument 'tags' must be "
-                            "an iterable of strings")
-        if isinstance(filenames, basestring):
-            raise TypeError("The argument 'filenames' must be "
-                            "an iterable of strings")
-        params = ["-" + t for t in tags]
-        params.extend(filenames)
-        return self.execute_json(*params)
+        return self.execute_json(*_encode_tag_params(tags, filenames))
 
     def get_tags(self, tags, filename):
         """Return only specified tags for a single file.
@@ -323,3 +341,190 @@ class ExifTool(object):
         ``None`` if this tag was not found in the file.
         """
         return self.get_tag_batch(tag, [filename])[0]
+
+
+class ExifToolPool(object):
+    """Run several `exiftool` processes and spread batch requests over them.
+
+    A single ``exiftool`` process only ever uses one core.  This class
+    starts ``size`` instances of :py:class:`ExifTool` (by default one
+    per core), splits the file list of each batch request into
+    contiguous shards, runs the shards concurrently and concatenates
+    the results, so the return values are in the same order as for a
+    single :py:class:`ExifTool`.
+
+    Like :py:class:`ExifTool`, the pool should be used as a context
+    manager to make sure all subprocesses are terminated::
+
+        with ExifToolPool(4) as et:
+            metadata = et.get_tags_batch(tags, files)
+    """
+
+    def __init__(self, size=None, executable_=None):
+        self.size = max(1, size or os.cpu_count() or 1)
+        self.workers = [ExifTool(executable_) for _ in range(self.size)]
+        self.running = False
+
+    def start(self):
+        """Start all ``exiftool`` processes of the pool."""
+        if self.running:
+            warnings.warn("ExifToolPool already running; doing nothing.")
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.size)
+        for worker in self.workers:
+            worker.start()
+        self.running = True
+
+    def terminate(self):
+        """Terminate all ``exiftool`` processes of the pool.
+
+        If the pool isn't running, this method will do nothing.
+        """
+        if not self.running:
+            return
+        self._executor.shutdown(wait=True)
+        for worker in self.workers:
+            worker.terminate()
+        self.running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.terminate()
+
+    def __del__(self):
+        self.terminate()
+
+    def _map_shards(self, method, filenames, *args):
+        if not self.running:
+            raise ValueError("ExifToolPool instance not running.")
+        filenames = list(filenames)
+        if not filenames:
+            return []
+        shard_size = -(-len(filenames) // self.size)
+        shards = [filenames[i:i + shard_size]
+                  for i in range(0, len(filenames), shard_size)]
+        futures = [self._executor.submit(getattr(worker, method), *(args + (shard,)))
+                   for worker, shard in zip(self.workers, shards)]
+        result = []
+        for future in futures:
+            result.extend(future.result())
+        return result
+
+    def get_metadata_batch(self, filenames):
+        """Return all meta-data for the given files.
+
+        See :py:meth:`ExifTool.get_metadata_batch()`.
+        """
+        if isinstance(filenames, basestring):
+            raise TypeError("The argument 'filenames' must be "
+                            "an iterable of strings")
+        return self._map_shards("get_metadata_batch", filenames)
+
+    def get_tags_batch(self, tags, filenames):
+        """Return only specified tags for the given files.
+
+        See :py:meth:`ExifTool.get_tags_batch()`.
+        """
+        _encode_tag_params(tags, filenames)
+        return self._map_shards("get_tags_batch", filenames, list(tags))
+
+
+class AsyncExifTool(object):
+    """Run the `exiftool` command-line tool from an asyncio event loop.
+
+    This is the asyncio counterpart of :py:class:`ExifTool`.  The
+    subprocess is started with the same common arguments, and
+    :py:meth:`execute()`, :py:meth:`execute_json()` and
+    :py:meth:`get_tags_batch()` are coroutines that don't block the
+    event loop while ``exiftool`` is working, so metadata requests can
+    be interleaved with other I/O.  Commands sent to the same instance
+    are serialized, since they share one pipe.
+
+    Use the instance as an asynchronous context manager to make sure
+    the subprocess is terminated::
+
+        async with AsyncExifTool() as et:
+            metadata = await et.get_tags_batch(tags, files)
+    """
+
+    def __init__(self, executable_=None):
+        if executable_ is None:
+            self.executable = executable
+        else:
+            self.executable = executable_
+        self.running = False
+
+    async def start(self):
+        """Start an ``exiftool`` process in batch mode for this instance.
+
+        See :py:meth:`ExifTool.start()` for the common options.
+        """
+        if self.running:
+            warnings.warn("ExifTool already running; doing nothing.")
+            return
+        self._process = await asyncio.create_subprocess_exec(
+            self.executable, "-stay_open", "True",  "-@", "-",
+            "-common_args", "-G", "-n",
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL)
+        self._lock = asyncio.Lock()
+        self.running = True
+
+    async def terminate(self):
+        """Terminate the ``exiftool`` process of this instance.
+
+        If the subprocess isn't running, this method will do nothing.
+        """
+        if not self.running:
+            return
+        self._process.stdin.write(b"-stay_open\nFalse\n")
+        await self._process.stdin.drain()
+        await self._process.communicate()
+        del self._process
+        self.running = False
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.terminate()
+
+    async def execute(self, *params):
+        """Execute the given batch of parameters with ``exiftool``.
+
+        This coroutine behaves like :py:meth:`ExifTool.execute()`.
+        """
+        if not self.running:
+            raise ValueError("ExifTool instance not running.")
+        async with self._lock:
+            self._process.stdin.write(b"\n".join(params + (b"-execute\n",)))
+            await self._process.stdin.drain()
+            chunks = []
+            tail = b""
+            while not tail.strip().endswith(sentinel):
+                chunk = await self._process.stdout.read(block_size)
+                if not chunk:
+                    raise IOError("exiftool exited before finishing the command.")
+                chunks.append(chunk)
+                tail = (tail + chunk)[-_sentinel_window:]
+        return _strip_sentinel(b"".join(chunks))
+
+    async def execute_json(self, *params):
+        """Execute the given batch of parameters and parse the JSON output.
+
+        This coroutine behaves like :py:meth:`ExifTool.execute_json()`.
+        """
+        params = tuple(map(fsencode, params))
+        output = await self.execute(b"-j", *params)
+        return json.loads(output.decode("utf-8"))
+
+    async def get_tags_batch(self, tags, filenames):
+        """Return only specified tags for the given files.
+
+        This coroutine behaves like :py:meth:`ExifTool.get_tags_batch()`.
+        """
+        return await self.execute_json(*_encode_tag_params(tags, filenames))
@@ -0,0 +1,154 @@
+import json
+import mmap
+import os
+import subprocess
+import sys
+import threading
+
+import tracing
+from clipdecoder import ppm_header, preview_size
+from metadatacache import get_clip_cache_path, prune_cache_directory
+
+
+FILMSTRIP_CACHE_DIRECTORY = 'filmstrips'
+FILMSTRIP_FRAME_RATE = 1
+MAX_FILMSTRIP_FILES = 2000
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def get_filmstrip_path(clip_path, width, height):
+    return get_clip_cache_path(clip_path, FILMSTRIP_CACHE_DIRECTORY, f'_{width}x{height}.ppms')
+
+
+class Filmstrip:
+    # One preview frame per second of a clip, stored back to back as fixed-size PPM records and read straight out
+    # of a memory map. frame_at returns a single bytes copy of the record (Tk only takes image data as bytes), with
+    # no decode, seek or file read in between.
+    def __init__(self, file_path, width, height):
+        self.frame_size = len(ppm_header(width, height)) + width * height * 3
+        self.file = open(file_path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.frame_count = len(self.map) // self.frame_size
+
+    def frame_at(self, seek_time):
+        # Only seek times that fall exactly on a filmstrip frame are served; anything between is left to the decoder
+        index = seek_time * FILMSTRIP_FRAME_RATE
+        if index != int(index) or not 0 <= index < self.frame_count:
+            return None
+        index = int(index)
+        return self.map[index * self.frame_size:(index + 1) * self.frame_size]
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+def open_filmstrip(clip_path, width, height):
+    file_path = get_filmstrip_path(clip_path, width, height)
+    if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
+        return None
+    os.utime(file_path)
+    return Filmstrip(file_path, width, height)
+
+
+def probe_preview_size(clip_path):
+    output = tracing.check_output(['ffprobe', '-v', 'error',
+                                   '-select_streams', 'v:0',
+                                   '-show_entries', 'stream=width,height',
+                                   '-of', 'json',
+                                   clip_path])
+    stream = json.loads(output)['streams'][0]
+    return preview_size(stream['width'], stream['height'])
+
+
+def build_filmstrip(clip_path, width, height, stop_event=None):
+    # Decodes the clip once and streams its 1 fps, preview-sized frames to disk. The file only appears under its
+    # final name when complete, so a half-built filmstrip is never opened.
+    file_path = get_filmstrip_path(clip_path, width, height)
+    if os.path.exists(file_path):
+        return file_path
+    temporary_path = f'{file_path}.{os.getpid()}.tmp'
+    command = ['ffmpeg', '-v', 'error', '-i', clip_path, '-an',
+               '-vf', f'fps={FILMSTRIP_FRAME_RATE},scale={width}:{height}',
+               '-f', 'image2pipe', '-c:v', 'ppm', '-pix_fmt', 'rgb24', '-']
+    with tracing.process_span(command) as process_span:
+        process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL)
+        try:
+            with open(temporary_path, 'wb') as filmstrip_file:
+                while True:
+                    if stop_event and stop_event.is_set():
+                        process.kill()
+                        break
+                    chunk = process.stdout.read(READ_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    filmstrip_file.write(chunk)
+            process.stdout.close()
+            returncode = process.wait()
+            process_span.set(exit_status=returncode)
+            if stop_event and stop_event.is_set():
+                return None
+            if returncode != 0:
+                raise subprocess.CalledProcessError(returncode, command)
+            os.replace(temporary_path, file_path)
+        finally:
+            if process.poll() == None:
+                process.kill()
+                process.wait()
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+    prune_cache_directory(os.path.dirname(file_path), MAX_FILMSTRIP_FILES)
+    return file_path
+
+
+class FilmstripBuilder:
+    # Builds filmstrips for requested clips one at a time on a background thread. A prioritized clip (the one the
+    # user just opened) jumps the queue.
+    def __init__(self):
+        self.pending = []
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify()
+
+    def request(self, clip_paths):
+        with self.condition:
+            for clip_path in clip_paths:
+                if clip_path not in self.pending:
+                    self.pending.append(clip_path)
+            self.condition.notify()
+
+    def prioritize(self, clip_path):
+        with self.condition:
+            if clip_path in self.pending:
+                self.pending.remove(clip_path)
+            self.pending.insert(0, clip_path)
+            self.condition.notify()
+
+    def clear(self):
+        with self.condition:
+            self.pending = []
+
+    def run(self):
+        while not self.stop_event.is_set():
+            with self.condition:
+                while not self.pending and not self.stop_event.is_set():
+                    self.condition.wait()
+                if self.stop_event.is_set():
+                    return
+                clip_path = self.pending.pop(0)
+            try:
+                build_filmstrip(clip_path, *probe_preview_size(clip_path), self.stop_event)
+            except (OSError, ValueError, KeyError, IndexError, subprocess.CalledProcessError) as e:
+                # Scrubbing falls back to decoding, so a clip without a filmstrip is not an error worth stopping for
+                print(f'Couldn\'t build a filmstrip for {clip_path}: {e}', file=sys.stderr)
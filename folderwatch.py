@@ -0,0 +1,154 @@
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import struct
+import threading
+
+from autointercututils import SUPPORTED_EXTENSIONS
+from outputmanifest import get_placeholder_paths
+
+
+POLL_INTERVAL_SECONDS = 2
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT_HEADER = struct.Struct('iIII')
+
+
+def is_movie_file(file_name):
+    return os.path.splitext(file_name)[1].upper() in SUPPORTED_EXTENSIONS
+
+
+def is_hardlinked(file_path):
+    try:
+        return os.stat(file_path).st_nlink > 1
+    except FileNotFoundError:
+        return False
+
+
+def load_libc_inotify():
+    if not hasattr(os, 'fsencode') or not ctypes.util.find_library('c'):
+        return None
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    if not hasattr(libc, 'inotify_init1'):
+        return None
+    return libc
+
+
+class FolderWatcher:
+    # Reports clips that finished being written to, or were removed from, a directory. Changes are queued as
+    # (changed_paths, removed_paths) and collected with get_changes() from whichever thread owns the clip group.
+    def __init__(self, directory, use_inotify=True):
+        self.directory = directory
+        self.use_inotify = use_inotify
+        self.changes = queue.Queue()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        libc = load_libc_inotify() if self.use_inotify else None
+        inotify_fd = -1
+        if libc:
+            inotify_fd = libc.inotify_init1(IN_CLOEXEC)
+            if inotify_fd >= 0 and libc.inotify_add_watch(inotify_fd, os.fsencode(self.directory),
+                                                          IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+                                                          | IN_DELETE) < 0:
+                os.close(inotify_fd)
+                inotify_fd = -1
+        # Network shares don't deliver inotify events for remote writes, which is what the polling fallback is for
+        if inotify_fd >= 0:
+            self.thread = threading.Thread(target=self.watch_inotify, args=(inotify_fd,), daemon=True)
+        else:
+            self.thread = threading.Thread(target=self.watch_polling, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def get_changes(self):
+        changed_paths = set()
+        removed_paths = set()
+        while True:
+            try:
+                changed, removed = self.changes.get_nowait()
+            except queue.Empty:
+                break
+            changed_paths = (changed_paths - removed) | changed
+            removed_paths = (removed_paths - changed) | removed
+        if changed_paths:
+            # Blank placeholders a sync cut writes into the folder aren't camera clips, and one written under a
+            # clip's old name takes its place
+            placeholder_paths = changed_paths & get_placeholder_paths(self.directory)
+            changed_paths -= placeholder_paths
+            removed_paths |= placeholder_paths
+        return changed_paths, removed_paths
+
+    def watch_inotify(self, inotify_fd):
+        try:
+            while not self.stop_event.is_set():
+                readable, _, _ = select.select([inotify_fd], [], [], POLL_INTERVAL_SECONDS)
+                if not readable:
+                    continue
+                data = os.read(inotify_fd, 64 * 1024)
+                changed_paths = set()
+                removed_paths = set()
+                offset = 0
+                while offset < len(data):
+                    _, mask, _, name_length = INOTIFY_EVENT_HEADER.unpack_from(data, offset)
+                    offset += INOTIFY_EVENT_HEADER.size
+                    file_name = os.fsdecode(data[offset:offset + name_length].rstrip(b'\0'))
+                    offset += name_length
+                    if not is_movie_file(file_name):
+                        continue
+                    file_path = os.path.join(self.directory, file_name)
+                    if mask & IN_CREATE:
+                        # A hardlinked clip arrives complete and is never written to, so it never sends
+                        # IN_CLOSE_WRITE. A freshly created file with a single link is still being written.
+                        if is_hardlinked(file_path):
+                            changed_paths.add(file_path)
+                            removed_paths.discard(file_path)
+                    elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                        changed_paths.add(file_path)
+                        removed_paths.discard(file_path)
+                    else:
+                        removed_paths.add(file_path)
+                        changed_paths.discard(file_path)
+                if changed_paths or removed_paths:
+                    self.changes.put((changed_paths, removed_paths))
+        finally:
+            os.close(inotify_fd)
+
+    def snapshot(self):
+        file_stats = {}
+        for file_name in os.listdir(self.directory):
+            if is_movie_file(file_name):
+                file_path = os.path.join(self.directory, file_name)
+                try:
+                    file_stat = os.stat(file_path)
+                except FileNotFoundError:
+                    continue
+                file_stats[file_path] = (file_stat.st_size, file_stat.st_mtime_ns)
+        return file_stats
+
+    def watch_polling(self):
+        reported = self.snapshot()
+        previous = reported
+        while not self.stop_event.wait(POLL_INTERVAL_SECONDS):
+            current = self.snapshot()
+            # A clip is only reported once it looks the same on two polls in a row, so copies in progress are skipped
+            changed_paths = {file_path for file_path, file_stat in current.items()
+                             if reported.get(file_path) != file_stat and previous.get(file_path) == file_stat}
+            removed_paths = set(reported) - set(current)
+            for file_path in changed_paths:
+                reported[file_path] = current[file_path]
+            for file_path in removed_paths:
+                del reported[file_path]
+            if changed_paths or removed_paths:
+                self.changes.put((changed_paths, removed_paths))
+            previous = current
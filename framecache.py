@@ -0,0 +1,108 @@
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from autointercututils import to_ffmpeg_duration
+from clipdecoder import scale_filter
+import tracing
+
+
+DEFAULT_FRAME_CACHE_BYTES = 256 * 1024 * 1024
+# Forward neighbors first so a streaming decoder can read ahead through them
+PREFETCH_OFFSETS = [1, 5, -1, -5]
+
+
+def extract_frame(clip_path, seek_time, width, height):
+    return tracing.check_output(['ffmpeg',
+                                    '-ss', to_ffmpeg_duration(seek_time),
+                                    '-i', clip_path,
+                                    '-vframes', '1',
+                                    '-vf', scale_filter(width, height),
+                                    '-f', 'image2pipe',
+                                    '-vcodec', 'ppm',
+                                    '-pix_fmt', 'rgb24',
+                                    '-'], stderr=subprocess.DEVNULL)
+
+
+class FrameCache:
+    # Decoded frames keyed by (clip path, seek time), evicted least recently used once over max_bytes
+    def __init__(self, decode_frame, max_bytes=DEFAULT_FRAME_CACHE_BYTES, prefetch_decode_frame=None):
+        self.decode_frame = decode_frame
+        self.prefetch_decode_frame = prefetch_decode_frame or decode_frame
+        self.max_bytes = max_bytes
+        self.frames = OrderedDict()
+        self.cached_bytes = 0
+        self.in_flight = {}
+        self.prefetch_generation = 0
+        self.lock = threading.Lock()
+        self.prefetch_executor = ThreadPoolExecutor(max_workers=1)
+
+    def get(self, clip_path, seek_time):
+        key = (clip_path, seek_time)
+        with self.lock:
+            if key in self.frames:
+                self.frames.move_to_end(key)
+                return self.frames[key]
+            in_flight = self.in_flight.get(key)
+
+        # A prefetch already decoding this frame is cheaper to wait for than to race
+        if in_flight:
+            in_flight.wait()
+            with self.lock:
+                if key in self.frames:
+                    self.frames.move_to_end(key)
+                    return self.frames[key]
+
+        frame = self.decode_frame(clip_path, seek_time)
+        self.put(key, frame)
+        return frame
+
+    def peek(self, clip_path, seek_time):
+        # Like get, but only ever returns an already decoded frame (or None) without blocking
+        key = (clip_path, seek_time)
+        with self.lock:
+            if key in self.frames:
+                self.frames.move_to_end(key)
+                return self.frames[key]
+        return None
+
+    def put(self, key, frame):
+        with self.lock:
+            if key in self.frames:
+                return
+            self.frames[key] = frame
+            self.cached_bytes += len(frame)
+            while self.cached_bytes > self.max_bytes and len(self.frames) > 1:
+                _, evicted_frame = self.frames.popitem(last=False)
+                self.cached_bytes -= len(evicted_frame)
+
+    def prefetch_neighbors(self, clip_path, seek_time, duration):
+        with self.lock:
+            self.prefetch_generation += 1
+            generation = self.prefetch_generation
+        for offset in PREFETCH_OFFSETS:
+            neighbor_time = seek_time + offset
+            if 0 <= neighbor_time < duration:
+                self.prefetch_executor.submit(self.prefetch, clip_path, neighbor_time, generation)
+
+    def prefetch(self, clip_path, seek_time, generation):
+        key = (clip_path, seek_time)
+        with self.lock:
+            # Neighbors of a position the user has already moved away from aren't worth decoding
+            if generation != self.prefetch_generation or key in self.frames or key in self.in_flight:
+                return
+            done = self.in_flight[key] = threading.Event()
+        try:
+            self.put(key, self.prefetch_decode_frame(clip_path, seek_time))
+        except subprocess.CalledProcessError:
+            pass
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            done.set()
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+            self.cached_bytes = 0
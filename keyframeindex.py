@@ -0,0 +1,83 @@
+import array
+import bisect
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+from cutpool import default_cut_workers
+from metadatacache import get_clip_cache_path, prune_cache_directory
+
+
+KEYFRAME_CACHE_DIRECTORY = 'keyframes'
+MAX_KEYFRAME_INDEX_FILES = 20000
+
+
+class KeyframeIndex:
+    # Sorted keyframe times of a clip's first video stream, in seconds from the start of the file
+    def __init__(self, times):
+        self.times = times
+
+    def preceding_keyframe(self, seek_time):
+        index = bisect.bisect_right(self.times, seek_time) - 1
+        return self.times[index] if index >= 0 else 0
+
+    def following_keyframe(self, seek_time):
+        index = bisect.bisect_left(self.times, seek_time)
+        return self.times[index] if index < len(self.times) else None
+
+
+def scan_keyframes(clip_path):
+    # One packet-level pass over the video stream; nothing is decoded
+    output = tracing.check_output(['ffprobe', '-v', 'error',
+                                   '-select_streams', 'v:0',
+                                   '-show_entries', 'format=start_time:packet=pts_time,dts_time,flags',
+                                   '-of', 'json=compact=1',
+                                   clip_path])
+    probe = json.loads(output)
+    # ffmpeg's input -ss is relative to the container start time, which MTS files rarely have at zero
+    start_time = float(probe.get('format', {}).get('start_time', 0))
+    times = array.array('d')
+    for packet in probe.get('packets', []):
+        packet_time = packet.get('pts_time')
+        if packet_time in (None, 'N/A'):
+            packet_time = packet.get('dts_time')
+        if 'K' in packet.get('flags', '') and packet_time not in (None, 'N/A'):
+            times.append(max(0.0, float(packet_time) - start_time))
+    return array.array('d', sorted(times))
+
+
+def load_keyframe_index(clip_path):
+    # Cached as raw doubles next to the metadata cache
+    cache_path = get_clip_cache_path(clip_path, KEYFRAME_CACHE_DIRECTORY, '.kf')
+    if os.path.exists(cache_path):
+        times = array.array('d')
+        with open(cache_path, 'rb') as cache_file:
+            times.frombytes(cache_file.read())
+        os.utime(cache_path)
+        return KeyframeIndex(times)
+
+    times = scan_keyframes(clip_path)
+    temporary_path = f'{cache_path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as cache_file:
+        times.tofile(cache_file)
+    os.replace(temporary_path, cache_path)
+    prune_cache_directory(os.path.dirname(cache_path), MAX_KEYFRAME_INDEX_FILES)
+    return KeyframeIndex(times)
+
+
+def load_keyframe_indexes(clip_paths, max_workers=None):
+    clip_paths = list(dict.fromkeys(clip_paths))
+    with ThreadPoolExecutor(max_workers=max_workers or default_cut_workers()) as executor:
+        return dict(zip(clip_paths, executor.map(load_keyframe_index, clip_paths)))
+
+
+def to_input_seek_time(keyframe_time):
+    # ffmpeg parses seek times to the microsecond. Input seeking lands on the last keyframe at or before the target,
+    # so the target is rounded up; output seeking drops packets before the target, so it is rounded down.
+    return math.ceil(keyframe_time * 10 ** 6) / 10 ** 6
+
+
+def to_output_seek_time(keyframe_time):
+    return math.floor(keyframe_time * 10 ** 6) / 10 ** 6
@@ -0,0 +1,69 @@
+import errno
+import os
+import shutil
+
+import tracing
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# ioctl request number of Linux's FICLONE (_IOW(0x94, 9, int))
+FICLONE = 0x40049409
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def reflink_file(source_path, output_path):
+    if fcntl == None:
+        raise OSError(errno.EOPNOTSUPP, 'Reflinks are not supported on this platform')
+    with open(source_path, 'rb') as source, open(output_path, 'wb') as output:
+        fcntl.ioctl(output.fileno(), FICLONE, source.fileno())
+
+
+def kernel_copy_file(source_path, output_path):
+    if not hasattr(os, 'copy_file_range'):
+        raise OSError(errno.EOPNOTSUPP, 'copy_file_range is not supported on this platform')
+    with open(source_path, 'rb') as source, open(output_path, 'wb') as output:
+        remaining = os.fstat(source.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(source.fileno(), output.fileno(), min(remaining, COPY_CHUNK_SIZE))
+            if copied == 0:
+                # The source shrank underneath us, or the filesystem gave up; leave it to the buffered copy
+                raise OSError(errno.EIO, f'copy_file_range stopped with {remaining} bytes left', source_path)
+            remaining -= copied
+
+
+def buffered_copy_file(source_path, output_path):
+    shutil.copyfile(source_path, output_path)
+
+
+# Cheapest first: a reflink shares the source's blocks until either is written, copy_file_range at least stays in the
+# kernel. Hardlinks are not used: cut jobs later write ffmpeg output over aicNNNN names in the same folders, and
+# through a shared inode that would truncate the camera original.
+MATERIALIZE_METHODS = [reflink_file, kernel_copy_file, buffered_copy_file]
+
+
+def materialize_file(source_path, output_path):
+    # Places source_path's content at output_path as cheaply as the filesystem allows and returns the method used
+    with tracing.span('materialize_file', 'io', source=source_path) as materialize:
+        method_name = materialize_with_fallbacks(source_path, output_path)
+        materialize.set(method=method_name)
+        if tracing.enabled:
+            materialize.set(bytes_in=os.path.getsize(source_path))
+        return method_name
+
+
+def materialize_with_fallbacks(source_path, output_path):
+    if os.path.lexists(output_path):
+        os.remove(output_path)
+    for method in MATERIALIZE_METHODS[:-1]:
+        try:
+            method(source_path, output_path)
+            return method.__name__
+        except OSError:
+            if os.path.lexists(output_path):
+                os.remove(output_path)
+    buffered_copy_file(source_path, output_path)
+    return buffered_copy_file.__name__
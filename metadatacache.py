@@ -0,0 +1,110 @@
+import hashlib
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+
+CACHE_DIRECTORY_ENV = 'AUTOINTERCUT_CACHE_DIR'
+CACHE_FILE_NAME = 'metadata.sqlite'
+MAX_CACHE_ENTRIES = 50000
+# Both GUI angles can probe against the one per-user cache at once; a writer waits this long for the other's commit
+CACHE_LOCK_TIMEOUT_SECONDS = 30
+
+
+def get_cache_directory():
+    directory = os.environ.get(CACHE_DIRECTORY_ENV) or os.path.join(os.path.expanduser('~'), '.autointercut')
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    return directory
+
+
+def get_clip_cache_path(clip_path, subdirectory, extension):
+    # Per-clip cache files are named after path, size and mtime, so a changed clip simply misses and is redone
+    file_stat = os.stat(clip_path)
+    key = f'{os.path.abspath(clip_path)}|{file_stat.st_size}|{file_stat.st_mtime_ns}'
+    directory = os.path.join(get_cache_directory(), subdirectory)
+    if not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + extension)
+
+
+def prune_cache_directory(directory, max_files):
+    # Least recently used first; readers touch the files they hit
+    file_names = os.listdir(directory)
+    if len(file_names) <= max_files:
+        return
+    file_paths = sorted((os.path.join(directory, file_name) for file_name in file_names), key=os.path.getmtime)
+    for file_path in file_paths[:len(file_paths) - max_files]:
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+
+
+class MetadataCache:
+    # Clip metadata keyed by absolute path; an entry is only valid while the file's size and mtime are unchanged
+    def __init__(self, cache_path=None, max_entries=MAX_CACHE_ENTRIES):
+        self.cache_path = cache_path or os.path.join(get_cache_directory(), CACHE_FILE_NAME)
+        self.max_entries = max_entries
+        self.connection = None
+
+    def open(self):
+        self.connection = sqlite3.connect(self.cache_path, timeout=CACHE_LOCK_TIMEOUT_SECONDS)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS clip_metadata ('
+                                'file_path TEXT PRIMARY KEY, '
+                                'file_size INTEGER NOT NULL, '
+                                'file_mtime INTEGER NOT NULL, '
+                                'datetime TEXT NOT NULL, '
+                                'duration REAL NOT NULL, '
+                                'last_used REAL NOT NULL)')
+
+    def close(self):
+        if self.connection == None:
+            return
+        self.prune()
+        self.connection.commit()
+        self.connection.close()
+        self.connection = None
+
+    def commit(self):
+        self.connection.commit()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def get(self, file_path, file_stat):
+        file_path = os.path.abspath(file_path)
+        row = self.connection.execute('SELECT file_size, file_mtime, datetime, duration FROM clip_metadata '
+                                      'WHERE file_path = ?', (file_path,)).fetchone()
+        if row == None:
+            return None
+        file_size, file_mtime, clip_datetime, duration = row
+        if file_size != file_stat.st_size or file_mtime != file_stat.st_mtime_ns:
+            self.invalidate(file_path)
+            return None
+        self.connection.execute('UPDATE clip_metadata SET last_used = ? WHERE file_path = ?', (time.time(), file_path))
+        return datetime.fromisoformat(clip_datetime), duration
+
+    def put(self, file_path, file_stat, clip_datetime, duration):
+        self.connection.execute('INSERT OR REPLACE INTO clip_metadata VALUES (?, ?, ?, ?, ?, ?)',
+                                (os.path.abspath(file_path), file_stat.st_size, file_stat.st_mtime_ns,
+                                 clip_datetime.isoformat(), duration, time.time()))
+
+    def invalidate(self, file_path):
+        self.connection.execute('DELETE FROM clip_metadata WHERE file_path = ?', (os.path.abspath(file_path),))
+
+    def clear(self):
+        self.connection.execute('DELETE FROM clip_metadata')
+
+    def prune(self):
+        # Least recently used entries go first once the cache is over its cap
+        count = self.connection.execute('SELECT COUNT(*) FROM clip_metadata').fetchone()[0]
+        if count > self.max_entries:
+            self.connection.execute('DELETE FROM clip_metadata WHERE file_path IN ('
+                                    'SELECT file_path FROM clip_metadata ORDER BY last_used LIMIT ?)',
+                                    (count - self.max_entries,))
@@ -0,0 +1,91 @@
+import json
+import os
+import threading
+
+
+OUTPUT_MANIFEST_NAME = 'aic_manifest.json'
+OUTPUT_MANIFEST_VERSION = 1
+STATUS_PLANNED = 'planned'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+# What a rerun compares to decide whether an output still matches what would be made now
+PLAN_FIELDS = ['kind', 'source', 'source_size', 'source_mtime_ns', 'start', 'duration', 'cut_mode']
+
+
+def get_output_manifest_path(directory):
+    return os.path.join(directory, OUTPUT_MANIFEST_NAME)
+
+
+def get_placeholder_paths(directory):
+    # Blank placeholder clips a sync cut left in directory, which mustn't be mistaken for camera clips
+    output_manifest = OutputManifest(directory)
+    return {os.path.join(directory, output_name) for output_name, entry in output_manifest.entries.items()
+            if entry['kind'] == 'placeholder'}
+
+
+class OutputManifest:
+    # Every output a cut run plans for one directory: its source, in point and duration, size and status. It is
+    # saved as each output completes, so a rerun after a crash or cancel skips outputs that are done and whose
+    # plan hasn't changed, and redoes only the rest.
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = get_output_manifest_path(directory)
+        self.lock = threading.Lock()
+        self.entries = {}
+        try:
+            with open(self.path) as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest.get('version') == OUTPUT_MANIFEST_VERSION:
+                self.entries = manifest['outputs']
+        except (OSError, ValueError, KeyError):
+            # A missing or unreadable manifest just means everything is redone
+            pass
+
+    def plan(self, output_path, kind, source_path=None, start=None, duration=None, cut_mode=None):
+        # Records the planned output and returns whether it is already done exactly as planned
+        entry = {'kind': kind, 'source': source_path, 'source_size': None, 'source_mtime_ns': None,
+                 'start': start, 'duration': duration, 'cut_mode': cut_mode, 'size': None, 'status': STATUS_PLANNED}
+        if source_path:
+            source_stat = os.stat(source_path)
+            entry['source_size'] = source_stat.st_size
+            entry['source_mtime_ns'] = source_stat.st_mtime_ns
+        output_name = os.path.basename(output_path)
+        with self.lock:
+            previous_entry = self.entries.get(output_name)
+            if previous_entry and self.is_complete(output_path, previous_entry) and \
+                    all(previous_entry.get(field) == entry[field] for field in PLAN_FIELDS):
+                return True
+            self.entries[output_name] = entry
+            return False
+
+    def is_complete(self, output_path, entry):
+        try:
+            return entry['status'] == STATUS_DONE and os.path.getsize(output_path) == entry['size']
+        except OSError:
+            return False
+
+    def is_done(self, output_path):
+        with self.lock:
+            entry = self.entries.get(os.path.basename(output_path))
+            return entry != None and self.is_complete(output_path, entry)
+
+    def mark_done(self, output_path):
+        self.set_status(output_path, STATUS_DONE, os.path.getsize(output_path))
+
+    def mark_failed(self, output_path):
+        self.set_status(output_path, STATUS_FAILED, None)
+
+    def set_status(self, output_path, status, size):
+        with self.lock:
+            entry = self.entries[os.path.basename(output_path)]
+            entry['status'] = status
+            entry['size'] = size
+        self.save()
+
+    def save(self):
+        with self.lock:
+            manifest = {'version': OUTPUT_MANIFEST_VERSION, 'outputs': dict(sorted(self.entries.items()))}
+            temporary_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(temporary_path, 'w') as manifest_file:
+                json.dump(manifest, manifest_file, indent=1)
+            os.replace(temporary_path, self.path)
@@ -0,0 +1,135 @@
+import subprocess
+
+import tracing
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+DETECT_FRAME_RATE = 4
+DETECT_WIDTH = 64
+DETECT_HEIGHT = 36
+FRAMES_PER_READ = 64
+# Mean luma below this counts as a black frame (lens cap, camera pointed at the ground, fade)
+BLACK_LEVEL = 16
+SMOOTH_SECONDS = 1
+# Motion this many median absolute deviations above the clip's median counts as a play in progress
+MOTION_THRESHOLD_MADS = 3
+# Floor for that deviation, in mean luma levels per pixel, so clean or static footage (deviation 0) still needs a
+# visible change to count
+MIN_MOTION_DEVIATION = 0.5
+MIN_PLAY_SECONDS = 3
+# Plays split by a lull shorter than this (a stumble, a pan that briefly stops) are kept as one
+MIN_GAP_SECONDS = 2
+PRE_ROLL_SECONDS = 1
+POST_ROLL_SECONDS = 1
+
+
+class PlayDetectionError(Exception):
+    pass
+
+
+def require_numpy():
+    if np == None:
+        raise PlayDetectionError('Play detection needs NumPy (pip install numpy)')
+
+
+def decode_small_frames(clip_path, duration=None, progress=None):
+    # One decode pass to tiny grayscale frames, read into a (frames, height, width) uint8 array
+    require_numpy()
+    command = ['ffmpeg', '-v', 'error', '-i', clip_path, '-an',
+               '-vf', f'fps={DETECT_FRAME_RATE},scale={DETECT_WIDTH}:{DETECT_HEIGHT}:flags=area,format=gray',
+               '-f', 'rawvideo', '-']
+    frame_size = DETECT_WIDTH * DETECT_HEIGHT
+    chunks = []
+    frame_count = 0
+    with tracing.process_span(command) as process_span:
+        process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL)
+        try:
+            while True:
+                if progress:
+                    progress.check_cancelled()
+                    if duration:
+                        progress.update('Detecting plays', int(frame_count / DETECT_FRAME_RATE), int(duration))
+                chunk = process.stdout.read(frame_size * FRAMES_PER_READ)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                frame_count += len(chunk) // frame_size
+            process.stdout.close()
+            process_span.set(exit_status=process.wait(), bytes_out=frame_count * frame_size)
+        finally:
+            if process.poll() == None:
+                process.kill()
+                process.wait()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command)
+    data = b''.join(chunks)
+    return np.frombuffer(data[:len(data) // frame_size * frame_size], dtype=np.uint8).reshape(-1, DETECT_HEIGHT,
+                                                                                            DETECT_WIDTH)
+
+
+def score_frames(frames):
+    # Returns (motion, black): the mean absolute change from the previous frame, smoothed over SMOOTH_SECONDS,
+    # and whether each frame is black
+    require_numpy()
+    if len(frames) == 0:
+        # Nothing decoded, e.g. an audio-only clip or one shorter than a detection frame
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=bool)
+    flat = frames.reshape(len(frames), -1).astype(np.int16)
+    difference = np.zeros(len(frames), dtype=np.float32)
+    if len(frames) > 1:
+        difference[1:] = np.abs(np.diff(flat, axis=0)).mean(axis=1)
+    window = max(1, SMOOTH_SECONDS * DETECT_FRAME_RATE)
+    motion = np.convolve(difference, np.ones(window, dtype=np.float32) / window, mode='same')
+    black = flat.mean(axis=1) < BLACK_LEVEL
+    return motion, black
+
+
+def find_runs(mask):
+    # (start, end) frame indexes of each run of True in mask, end exclusive
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return list(zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()))
+
+
+def detect_plays(motion, black):
+    # Plays are stretches of motion well above the clip's typical level, on frames that aren't black. Returns
+    # (start, end) times in seconds.
+    require_numpy()
+    if len(motion) == 0:
+        return []
+    median = np.median(motion)
+    deviation = max(np.median(np.abs(motion - median)), MIN_MOTION_DEVIATION)
+    active = (motion > median + MOTION_THRESHOLD_MADS * deviation) & ~black
+
+    plays = []
+    for start, end in find_runs(active):
+        if plays and start - plays[-1][1] < MIN_GAP_SECONDS * DETECT_FRAME_RATE:
+            plays[-1] = (plays[-1][0], end)
+        else:
+            plays.append((start, end))
+    return [(start / DETECT_FRAME_RATE, end / DETECT_FRAME_RATE) for start, end in plays
+            if end - start >= MIN_PLAY_SECONDS * DETECT_FRAME_RATE]
+
+
+def plays_to_marks(plays, duration):
+    # Whole-second start/end marks with a little pre- and post-roll, never overlapping the previous play
+    marks = []
+    for start, end in plays:
+        start_mark = max(0, int(start) - PRE_ROLL_SECONDS)
+        end_mark = min(int(duration), int(end + 0.999) + POST_ROLL_SECONDS)
+        if marks and start_mark <= marks[-1]:
+            start_mark = marks[-1] + 1
+        if end_mark > start_mark:
+            marks.extend([start_mark, end_mark])
+    return marks
+
+
+@tracing.traced('detect_plays')
+def suggest_marks(clip_path, duration, progress=None):
+    frames = decode_small_frames(clip_path, duration, progress)
+    motion, black = score_frames(frames)
+    return plays_to_marks(detect_plays(motion, black), duration)
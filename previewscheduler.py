@@ -0,0 +1,69 @@
+import threading
+
+
+POLL_INTERVAL_MS = 10
+
+
+class PreviewScheduler:
+    # Decodes preview frames for the Tk thread on one worker thread. Only the latest request is kept: a request made
+    # while a frame is decoding replaces whatever was still waiting, and a frame finished for a position the user has
+    # since moved on from is dropped. Holding down an arrow key therefore costs at most one stale decode.
+    def __init__(self, widget, get_frame, show_frame):
+        self.widget = widget
+        self.get_frame = get_frame
+        self.show_frame = show_frame
+        self.condition = threading.Condition()
+        self.generation = 0
+        self.delivered_generation = 0
+        self.pending = None
+        self.result = None
+        self.after_id = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def request(self, clip_path, seek_time):
+        with self.condition:
+            self.generation += 1
+            self.pending = (self.generation, clip_path, seek_time)
+            self.condition.notify()
+        if self.after_id == None:
+            self.after_id = self.widget.after(POLL_INTERVAL_MS, self.poll)
+
+    def cancel(self):
+        # Called whenever something else puts a frame on screen, so an older decode can't overwrite it
+        with self.condition:
+            self.generation += 1
+            self.delivered_generation = self.generation
+            self.pending = None
+            self.result = None
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending == None:
+                    self.condition.wait()
+                generation, clip_path, seek_time = self.pending
+                self.pending = None
+            try:
+                frame = self.get_frame(clip_path, seek_time)
+            except Exception:
+                # The clip may have been closed or switched under the decode; the next request starts afresh
+                frame = None
+            with self.condition:
+                if generation == self.generation:
+                    self.result = (generation, frame)
+
+    def poll(self):
+        self.after_id = None
+        with self.condition:
+            result = self.result
+            self.result = None
+            if result != None and result[0] != self.generation:
+                result = None
+            if result != None:
+                self.delivered_generation = result[0]
+            waiting = self.delivered_generation != self.generation
+        if result != None and result[1] != None:
+            self.show_frame(result[1])
+        if waiting:
+            self.after_id = self.widget.after(POLL_INTERVAL_MS, self.poll)
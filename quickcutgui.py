@@ -1,13 +1,19 @@
 import json
 import os
 import re
-import subprocess
 import tkinter as tk
 import TkinterDnD2 as tkdnd
 import bisect
 from autointercututils import to_ffmpeg_duration, pairs
 from autointercut import cut_clip_into_subclips
-from PIL import Image, ImageTk
+from cutpool import report_failed_cuts
+from backgroundjob import BackgroundJob, JobCancelled
+from clipdecoder import ClipDecoder, ClipPlayback, parse_frame_rate, preview_size
+from filmstrip import FilmstripBuilder, open_filmstrip
+from framecache import FrameCache, extract_frame
+from playdetect import suggest_marks
+from previewscheduler import PreviewScheduler
+import tracing
 
 
 
@@ -18,6 +24,14 @@ class QuickCutGui(tk.Frame):
         self.marks = []
         self.current_clip_path = None
         self.clip_info = None
+        self.job = None
+        self.decoder = None
+        self.prefetch_decoder = None
+        self.playback = None
+        self.frame_cache = FrameCache(self.decode_frame, prefetch_decode_frame=self.prefetch_frame)
+        self.filmstrip = None
+        self.filmstrip_builder = FilmstripBuilder().start()
+        self.preview_scheduler = PreviewScheduler(self, self.frame_cache.get, self.show_frame)
 
         # Clip Label
         self.clip_drop_lbl = tk.Label(self, text=f'Drop Clip Here')
@@ -32,6 +46,12 @@ class QuickCutGui(tk.Frame):
         self.clip_panel.bind('<Button-1>', lambda event: self.focus_set())
         self.bind_all('<KeyPress>', self.handle_input)
 
+        # Playback controls
+        playback_frame = tk.Frame(self)
+        playback_frame.grid(row=2, column=0)
+        tk.Button(playback_frame, text='Play/Pause', command=lambda: self.toggle_playback(1)).grid(row=0, column=0)
+        tk.Button(playback_frame, text='Play 2x', command=lambda: self.toggle_playback(2)).grid(row=0, column=1)
+
         # Subclip Listbox
         subclip_lb_frame = tk.Frame(self)
         subclip_lb_frame.grid(row=1, column=1, rowspan=2, sticky='NS')
@@ -50,9 +70,16 @@ class QuickCutGui(tk.Frame):
         y_scroll.config(command=self.subclip_lb.yview)
         tk.Button(subclip_lb_frame, text='Delete subclip', command=self.delete_subclip_marks).grid(row=3, column=0)
         tk.Button(subclip_lb_frame, text='Produce subclips', command=self.produce_subclips).grid(row=4, column=0)
+        self.status_lbl = tk.Label(subclip_lb_frame)
+        self.status_lbl.grid(row=5, column=0)
+        tk.Button(subclip_lb_frame, text='Cancel', command=self.cancel_job).grid(row=6, column=0)
+        self.frame_accurate = tk.BooleanVar(value=False)
+        tk.Checkbutton(subclip_lb_frame, text='Frame accurate', variable=self.frame_accurate).grid(row=7, column=0)
+        tk.Button(subclip_lb_frame, text='Suggest subclips', command=self.suggest_subclips).grid(row=8, column=0)
 
 
     def get_file(self, event):
+        self.close_decoders()
         self.current_seek_time = 0
         self.current_clip_path = None
         self.marks = []
@@ -65,43 +92,93 @@ class QuickCutGui(tk.Frame):
 
         self.current_clip_path = file_path
 
-        video_size_output = subprocess.check_output(['ffprobe',
-                                                     '-v', 'quiet',
-                                                     '-print_format', 'json',
-                                                     '-show_format',
-                                                     '-show_streams',
-                                                     self.current_clip_path])
+        video_size_output = tracing.check_output(['ffprobe',
+                                                  '-v', 'quiet',
+                                                  '-print_format', 'json',
+                                                  '-show_format',
+                                                  '-show_streams',
+                                                  self.current_clip_path])
 
         video_info = json.loads(video_size_output)
         self.clip_info = {}
         self.clip_info['width'] = video_info['streams'][0]['width']
         self.clip_info['height'] = video_info['streams'][0]['height']
         self.clip_info['duration'] = float(video_info['streams'][0]['duration'])
+        self.clip_info['frame_rate'] = parse_frame_rate(video_info['streams'][0]['r_frame_rate'])
+        self.clip_info['preview_size'] = preview_size(self.clip_info['width'], self.clip_info['height'])
+        self.open_decoders()
         self.update_clip_panel()
 
+    def open_decoders(self):
+        self.close_decoders()
+        self.decoder = ClipDecoder(self.current_clip_path, *self.clip_info['preview_size'],
+                                   self.clip_info['frame_rate'])
+        self.prefetch_decoder = ClipDecoder(self.current_clip_path, *self.clip_info['preview_size'],
+                                            self.clip_info['frame_rate'])
+        self.playback = ClipPlayback(self, self.decoder, self.show_frame, self.playback_stopped)
+        self.filmstrip = open_filmstrip(self.current_clip_path, *self.clip_info['preview_size'])
+        if self.filmstrip == None:
+            self.filmstrip_builder.prioritize(self.current_clip_path)
+
+    def close_decoders(self):
+        self.preview_scheduler.cancel()
+        if self.playback:
+            self.playback.stop()
+        if self.filmstrip:
+            self.filmstrip.close()
+            self.filmstrip = None
+        if self.decoder:
+            with self.decoder.lock:
+                self.decoder.close()
+        if self.prefetch_decoder:
+            with self.prefetch_decoder.lock:
+                self.prefetch_decoder.close()
+
+    def decode_frame(self, clip_path, seek_time):
+        if not self.decoder or clip_path != self.decoder.clip_path:
+            return extract_frame(clip_path, seek_time, *self.clip_info['preview_size'])
+        return self.decoder.frame_at(seek_time)
+
+    def prefetch_frame(self, clip_path, seek_time):
+        if not self.prefetch_decoder or clip_path != self.prefetch_decoder.clip_path:
+            return extract_frame(clip_path, seek_time, *self.clip_info['preview_size'])
+        return self.prefetch_decoder.frame_at(seek_time)
 
+    @tracing.traced('preview')
     def update_clip_panel(self):
-        # Update image
-        timestamp = to_ffmpeg_duration(self.current_seek_time)
-        image_data = subprocess.check_output(['ffmpeg',
-                                              '-ss', timestamp,
-                                              '-i', self.current_clip_path,
-                                              '-vframes', '1',
-                                              '-f', 'image2pipe',
-                                              '-vcodec', 'rawvideo',
-                                              '-pix_fmt', 'rgb24',
-                                              '-'], bufsize=10 ** 8, stderr=subprocess.DEVNULL)
-        image = Image.frombytes('RGB', (self.clip_info['width'], self.clip_info['height']), image_data)
-        iwidth, iheight = image.size
-        aspect_ratio = iwidth / iheight
-        image = image.resize((640, int(640 / aspect_ratio)), Image.ANTIALIAS)
-        image = ImageTk.PhotoImage(image)
-        self.clip_panel.configure(image=image)
-        self.clip_panel.image = image
+        # Update image; whole-second seeks are served from the clip's filmstrip once it has been built, and cached
+        # frames are shown at once. Anything else is handed to the preview scheduler, so the label never waits.
+        filmstrip_frame = self.get_filmstrip_frame(self.current_seek_time)
+        image_data = filmstrip_frame
+        if image_data == None:
+            image_data = self.frame_cache.peek(self.current_clip_path, self.current_seek_time)
+        if image_data != None:
+            self.preview_scheduler.cancel()
+            self.show_frame(image_data)
+        else:
+            self.preview_scheduler.request(self.current_clip_path, self.current_seek_time)
+        if filmstrip_frame == None:
+            self.frame_cache.prefetch_neighbors(self.current_clip_path, self.current_seek_time,
+                                                self.clip_info['duration'])
 
         # Update label
+        self.update_time_label()
+
+    def update_time_label(self):
+        timestamp = to_ffmpeg_duration(self.current_seek_time)
         self.clip_drop_lbl.configure(text=f'{timestamp} {self.seek_time_status()}')
 
+    def get_filmstrip_frame(self, seek_time):
+        if self.filmstrip == None:
+            self.filmstrip = open_filmstrip(self.current_clip_path, *self.clip_info['preview_size'])
+        return self.filmstrip.frame_at(seek_time) if self.filmstrip else None
+
+    def show_frame(self, image_data):
+        # Frames arrive from the decoder as panel-sized PPM data, which Tk can load directly
+        image = tk.PhotoImage(data=image_data, format='PPM')
+        self.clip_panel.configure(image=image)
+        self.clip_panel.image = image
+
     def update_subclip_lb(self):
         # Update image
         self.subclip_lb.delete(0, tk.END)
@@ -111,9 +188,27 @@ class QuickCutGui(tk.Frame):
             else:
                 self.subclip_lb.insert(tk.END, f'{to_ffmpeg_duration(i)} to ---')
 
+    def toggle_playback(self, speed):
+        if not self.clip_info:
+            return
+        if self.playback.playing:
+            self.playback.stop()
+        else:
+            self.preview_scheduler.cancel()
+            self.playback.start(self.current_seek_time, speed)
+
+    def playback_stopped(self, position):
+        self.current_seek_time = max(0, min(int(position), int(self.clip_info['duration'] - 1)))
+        self.update_time_label()
+
     def handle_input(self, event):
         if not self.clip_info:
             return
+        if event.keysym == 'p':
+            self.toggle_playback(1)
+            return
+        if self.playback.playing:
+            self.playback.stop()
         if event.keysym == 'Left':
             next_seek_time = self.current_seek_time - 1
         elif event.keysym == 'Right':
@@ -148,12 +243,47 @@ class QuickCutGui(tk.Frame):
         self.update_subclip_lb()
 
     def produce_subclips(self):
-        if len(self.marks) < 2:
+        if len(self.marks) < 2 or (self.job and self.job.running):
             return
 
         mark_time_pairs = [(to_ffmpeg_duration(i), to_ffmpeg_duration(j-i)) for i, j in pairs(self.marks) if j != None]
         print(mark_time_pairs)
-        cut_clip_into_subclips(self.current_clip_path, mark_time_pairs)
+        clip_path = self.current_clip_path
+        cut_mode = 'SMART_RENDER' if self.frame_accurate.get() else 'COPY'
+        self.job = BackgroundJob(self, lambda progress: cut_clip_into_subclips(clip_path, mark_time_pairs,
+                                                                               progress=progress, cut_mode=cut_mode),
+                                 on_done=self.subclips_done, on_error=self.subclips_failed,
+                                 on_progress=lambda status: self.status_lbl.configure(text=status)).start()
+
+    def suggest_subclips(self):
+        if not self.clip_info or (self.job and self.job.running):
+            return
+        clip_path = self.current_clip_path
+        duration = self.clip_info['duration']
+        self.job = BackgroundJob(self, lambda progress: suggest_marks(clip_path, duration, progress),
+                                 on_done=lambda marks: self.suggestions_done(clip_path, marks),
+                                 on_error=self.subclips_failed,
+                                 on_progress=lambda status: self.status_lbl.configure(text=status)).start()
+
+    def suggestions_done(self, clip_path, marks):
+        # Suggestions replace the current marks; they're a starting point for the operator to adjust
+        if clip_path != self.current_clip_path:
+            return
+        self.marks = marks
+        self.update_subclip_lb()
+        self.update_clip_panel()
+        self.status_lbl.configure(text=f'{len(marks) // 2} subclips suggested')
+
+    def cancel_job(self):
+        if self.job and self.job.running:
+            self.job.cancel()
+
+    def subclips_done(self, results):
+        failed_results = report_failed_cuts(results)
+        self.status_lbl.configure(text=f'Done, {len(failed_results)} cuts failed' if failed_results else 'Done')
+
+    def subclips_failed(self, e):
+        self.status_lbl.configure(text='Cancelled' if isinstance(e, JobCancelled) else f'Failed: {e}')
 
 
     def seek_time_status(self):
@@ -0,0 +1,107 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+from autointercututils import to_ffmpeg_duration
+from cutpool import CutJob, default_cut_workers
+from keyframeindex import to_input_seek_time, to_output_seek_time
+
+
+# Boundary GOPs are re-encoded with the source's own codec so the parts can be joined without touching the middle
+SMART_RENDER_ENCODERS = {'h264': 'libx264', 'hevc': 'libx265'}
+FALLBACK_ENCODER = 'libx264'
+ENCODE_ARGS = ['-crf', '18', '-preset', 'veryfast']
+# Containers that store H.264/HEVC as Annex B with the parameter sets repeated in-band. Copied GOPs only keep
+# decoding next to re-encoded ones if they carry their own SPS/PPS; MP4 keeps a single set in the sample description.
+IN_BAND_PARAMETER_SET_FORMATS = {'mpegts'}
+
+
+class VideoEncoding:
+    def __init__(self, codec_name, pix_fmt, format_name=None):
+        self.codec_name = codec_name
+        self.pix_fmt = pix_fmt
+        self.format_name = format_name
+
+    @property
+    def encoder(self):
+        return SMART_RENDER_ENCODERS.get(self.codec_name)
+
+    @property
+    def can_copy_gops(self):
+        return self.encoder != None and self.format_name in IN_BAND_PARAMETER_SET_FORMATS
+
+    def encode_args(self):
+        args = ['-c:v', self.encoder or FALLBACK_ENCODER] + ENCODE_ARGS
+        if self.pix_fmt:
+            args.extend(['-pix_fmt', self.pix_fmt])
+        return args
+
+
+def probe_video_encoding(clip_path):
+    output = tracing.check_output(['ffprobe', '-v', 'error',
+                                   '-select_streams', 'v:0',
+                                   '-show_entries', 'stream=codec_name,pix_fmt:format=format_name',
+                                   '-of', 'json',
+                                   clip_path])
+    probe = json.loads(output)
+    streams = probe.get('streams') or [{}]
+    return VideoEncoding(streams[0].get('codec_name'), streams[0].get('pix_fmt'),
+                         probe.get('format', {}).get('format_name'))
+
+
+def probe_video_encodings(clip_paths, max_workers=None):
+    clip_paths = list(dict.fromkeys(clip_paths))
+    with ThreadPoolExecutor(max_workers=max_workers or default_cut_workers()) as executor:
+        return dict(zip(clip_paths, executor.map(probe_video_encoding, clip_paths)))
+
+
+def encode_part_args(clip_path, start, duration, encoding, part_path):
+    return ['ffmpeg', '-y', '-ss', to_ffmpeg_duration(start), '-i', clip_path, '-t', to_ffmpeg_duration(duration),
+            '-map', '0:v:0'] + encoding.encode_args() + ['-f', 'mpegts', part_path]
+
+
+def copy_part_args(clip_path, start, duration, part_path):
+    return ['ffmpeg', '-y', '-ss', to_ffmpeg_duration(start), '-i', clip_path, '-t', to_ffmpeg_duration(duration),
+            '-map', '0:v:0', '-c', 'copy', '-f', 'mpegts', part_path]
+
+
+def plan_smart_cut(clip_path, start, duration, output_path, keyframe_index, encoding):
+    # Frame-accurate cut of [start, start + duration). Only the partial GOPs before the first and after the last
+    # keyframe inside the range are re-encoded; the video in between is stream copied and the MPEG-TS parts are
+    # joined with the concat demuxer. Audio is stream copied in one piece from the source when the parts are joined.
+    # Sources that can't have GOPs copied next to encoded ones (see IN_BAND_PARAMETER_SET_FORMATS) are re-encoded
+    # over the whole range.
+    end = start + duration
+    first_keyframe = keyframe_index.following_keyframe(start)
+    last_keyframe = keyframe_index.preceding_keyframe(end)
+    if not encoding.can_copy_gops or first_keyframe == None or first_keyframe >= last_keyframe:
+        return CutJob(['ffmpeg', '-y', '-ss', to_ffmpeg_duration(start), '-i', clip_path,
+                       '-t', to_ffmpeg_duration(duration), '-map', '0:v:0', '-map', '0:a?']
+                      + encoding.encode_args() + ['-c:a', 'copy', output_path], output_path,
+                      output_ranges={output_path: (clip_path, start, duration)})
+
+    part_commands = []
+    part_paths = []
+    if first_keyframe > start:
+        part_paths.append(f'{output_path}.head.ts')
+        part_commands.append(encode_part_args(clip_path, start, first_keyframe - start, encoding, part_paths[-1]))
+    part_paths.append(f'{output_path}.middle.ts')
+    middle_start = to_input_seek_time(first_keyframe)
+    part_commands.append(copy_part_args(clip_path, middle_start, to_output_seek_time(last_keyframe) - middle_start,
+                                        part_paths[-1]))
+    if end > last_keyframe:
+        part_paths.append(f'{output_path}.tail.ts')
+        part_commands.append(encode_part_args(clip_path, last_keyframe, end - last_keyframe, encoding, part_paths[-1]))
+
+    # Written by the job when it starts, so a plan that never runs leaves nothing behind
+    concat_list_path = f'{output_path}.concat.txt'
+    concat_list = ''.join("file '{}'\n".format(os.path.abspath(part_path).replace("'", "'\\''"))
+                          for part_path in part_paths)
+
+    join_command = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', concat_list_path,
+                    '-ss', to_ffmpeg_duration(start), '-t', to_ffmpeg_duration(duration), '-i', clip_path,
+                    '-map', '0:v:0', '-map', '1:a?', '-c', 'copy', output_path]
+    return CutJob(part_commands[0], output_path, follow_up_commands=part_commands[1:] + [join_command],
+                  scratch_paths=part_paths, scratch_files={concat_list_path: concat_list},
+                  output_ranges={output_path: (clip_path, start, duration)})
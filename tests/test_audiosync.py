@@ -0,0 +1,36 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from audiosync import ENVELOPE_SAMPLE_RATE, MIN_SYNC_CONFIDENCE, estimate_offset
+
+
+def whistle_envelopes(lag_seconds, seconds=60, seed=1):
+    # Sparse onsets (whistles, pads popping) over low background noise; the secondary hears them lag_seconds earlier
+    rng = np.random.default_rng(seed)
+    base = rng.normal(0, 0.05, seconds * ENVELOPE_SAMPLE_RATE)
+    base[rng.choice(len(base), 40, replace=False)] += 1
+    lag = int(lag_seconds * ENVELOPE_SAMPLE_RATE)
+    return base, base[lag:].copy()
+
+
+def test_finds_the_offset():
+    offset, confidence = estimate_offset(*whistle_envelopes(3))
+    assert offset == pytest.approx(3, abs=1 / ENVELOPE_SAMPLE_RATE)
+    assert confidence >= MIN_SYNC_CONFIDENCE
+
+
+def test_offset_within_the_allowed_window():
+    offset, confidence = estimate_offset(*whistle_envelopes(3), max_offset=5)
+    assert offset == pytest.approx(3, abs=1 / ENVELOPE_SAMPLE_RATE)
+    assert confidence >= MIN_SYNC_CONFIDENCE
+
+
+def test_true_offset_outside_the_window_is_not_trusted():
+    base, secondary = whistle_envelopes(3)
+    # A fainter echo of the same sounds half a second off gives a clear but wrong peak inside the window
+    echo_lag = int(0.5 * ENVELOPE_SAMPLE_RATE)
+    secondary = secondary + 0.5 * base[echo_lag:echo_lag + len(secondary)]
+    assert estimate_offset(base, secondary)[0] == pytest.approx(3, abs=1 / ENVELOPE_SAMPLE_RATE)
+    _, confidence = estimate_offset(base, secondary, max_offset=1)
+    assert confidence < MIN_SYNC_CONFIDENCE
@@ -0,0 +1,22 @@
+from autointercututils import Clip, from_ffmpeg_duration, to_ffmpeg_duration, with_synchronized_time
+
+
+def test_synchronized_time_is_measured_from_the_sync_clip_plus_offset():
+    clips = [Clip('a.MP4', 1000.0, 10), Clip('b.MP4', 1030.5, 10)]
+    assert with_synchronized_time(clips, 1000.0, 2) is clips
+    assert [clip.synchronize_time for clip in clips] == [-2.0, 28.5]
+
+
+def test_synchronizing_an_empty_folder():
+    assert with_synchronized_time([], None, 0) == []
+
+
+def test_clips_without_a_sync_clip_are_left_alone():
+    clips = [Clip('a.MP4', 1000.0, 10)]
+    assert with_synchronized_time(clips, None, 0) == clips
+    assert clips[0].synchronize_time == None
+
+
+def test_ffmpeg_duration_round_trip():
+    assert to_ffmpeg_duration(3725.5) == '1:2:5.5'
+    assert from_ffmpeg_duration('1:2:5.5') == 3725.5
@@ -0,0 +1,126 @@
+import argparse
+import json
+import os
+
+import pytest
+
+import autointercut
+from autointercut import BatchSession, build_arg_parser, load_manifest, parse_mark, run_batch_jobs
+
+
+class RecordingSession:
+    def __init__(self):
+        self.calls = []
+
+    def sync_cut(self, *args):
+        self.calls.append(('sync_cut',) + args)
+        return []
+
+    def auto_cut_secondary(self, *args):
+        self.calls.append(('auto_cut_secondary',) + args)
+        return []
+
+    def subclip(self, *args):
+        self.calls.append(('subclip',) + args)
+        return []
+
+
+def write_manifest(tmp_path, manifest):
+    manifest_path = tmp_path / 'week.json'
+    manifest_path.write_text(json.dumps(manifest))
+    return str(manifest_path)
+
+
+def test_load_manifest(tmp_path):
+    manifest_path = write_manifest(tmp_path, {'cut_mode': 'SMART_RENDER', 'jobs': [
+        {'command': 'sync-cut', 'angles': [['Game1/EndZone', 0, 0], ['Game1/Sideline', 1, 2.5]], 'option': 'COPY'},
+        {'command': 'auto-cut-secondary', 'base': ['Game1/EndZone', 0, 0], 'secondaries': [['Game1/Sideline', 0, 2]],
+         'cut_mode': 'COPY'},
+        {'command': 'subclip', 'file': 'Game1/EndZone/aic0001.MP4', 'marks': [[12, 30], [45, 61.5]]},
+    ]})
+    jobs = load_manifest(manifest_path)
+    assert [name for name, _ in jobs] == ['sync-cut', 'auto-cut-secondary', 'subclip']
+
+    session = RecordingSession()
+    for _, run_job in jobs:
+        run_job(session)
+    end_zone = os.path.join(str(tmp_path), 'Game1/EndZone')
+    sideline = os.path.join(str(tmp_path), 'Game1/Sideline')
+    assert session.calls == [
+        ('sync_cut', [(end_zone, 0, 0.0), (sideline, 1, 2.5)], 'COPY'),
+        ('auto_cut_secondary', (end_zone, 0, 0.0), [(sideline, 0, 2.0)], 'COPY'),
+        ('subclip', os.path.join(str(tmp_path), 'Game1/EndZone/aic0001.MP4'), [(12.0, 30.0), (45.0, 61.5)],
+         'SMART_RENDER'),
+    ]
+
+
+def test_load_manifest_defaults(tmp_path):
+    manifest_path = write_manifest(tmp_path, {'jobs': [{'command': 'sync-cut', 'angles': [['A', 0, 0]]}]})
+    session = RecordingSession()
+    load_manifest(manifest_path)[0][1](session)
+    assert session.calls[0][2] == 'RENAME_AND_PAD'
+
+
+def test_load_manifest_rejects_unknown_commands(tmp_path):
+    with pytest.raises(ValueError):
+        load_manifest(write_manifest(tmp_path, {'jobs': [{'command': 'burn-dvd'}]}))
+
+
+def test_parse_subcommands():
+    args = build_arg_parser().parse_args(['--trace', 'trace.json', 'auto-cut-secondary', '--base', 'A', '0', '0',
+                                          '--secondary', 'B', '1', '-3', '--secondary', 'C', '0', '2',
+                                          '--frame-accurate'])
+    assert args.command == 'auto-cut-secondary' and args.trace == 'trace.json' and args.frame_accurate
+    assert args.secondary == [['B', '1', '-3'], ['C', '0', '2']]
+    with pytest.raises(SystemExit):
+        build_arg_parser().parse_args(['sync-cut'])
+
+
+def test_marks_must_end_after_they_start():
+    assert parse_mark(['1', '4.5']) == (1.0, 4.5)
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_mark(['4', '4'])
+
+
+def test_legacy_command_line_is_still_accepted(monkeypatch):
+    calls = []
+    monkeypatch.setattr(autointercut, 'run_legacy_command', calls.append)
+    autointercut.main(['base', '0', '0', 'secondary', '0', '5', 'SYNC_CUT_DIRS'])
+    assert calls == [['base', '0', '0', 'secondary', '0', '5', 'SYNC_CUT_DIRS']]
+
+
+def test_a_failing_job_does_not_stop_the_batch(monkeypatch, capsys):
+    session = RecordingSession()
+
+    class SessionContext:
+        def __init__(self, cut_workers):
+            pass
+
+        def __enter__(self):
+            return session
+
+        def __exit__(self, *exc_info):
+            pass
+
+    def broken_job(session):
+        raise TypeError('unsupported operand')
+
+    monkeypatch.setattr(autointercut, 'BatchSession', SessionContext)
+    ok = run_batch_jobs([('sync-cut', broken_job), ('subclip', lambda session: session.subclip('a.MP4', [], 'COPY'))])
+    assert not ok
+    assert session.calls == [('subclip', 'a.MP4', [], 'COPY')]
+    assert 'TypeError' in capsys.readouterr().err
+
+
+def test_renamed_folders_are_forgotten_even_if_the_rename_fails(monkeypatch, tmp_path):
+    session = BatchSession.__new__(BatchSession)
+    session.clip_groups = {str(tmp_path / 'A'): object(), str(tmp_path / 'B'): object()}
+    monkeypatch.setattr(session, 'clip_group', lambda *angle: angle)
+
+    def crash(clip_groups, option):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(autointercut, 'sync_cut_clip_groups', crash)
+    with pytest.raises(OSError):
+        session.sync_cut([(str(tmp_path / 'A'), 0, 0)])
+    assert list(session.clip_groups) == [str(tmp_path / 'B')]
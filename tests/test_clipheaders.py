@@ -0,0 +1,92 @@
+import datetime
+import struct
+
+import pytest
+
+from clipheaders import (MDPM_UUID, MTS_PACKET_SIZE, PTS_WRAP, QUICKTIME_EPOCH_OFFSET, TS_PACKET_SIZE,
+                         parse_mdpm_datetime, read_clip_header)
+
+
+CREATION_DATETIME = datetime.datetime(2026, 9, 5, 16, 30, 12)
+
+
+def box(box_type, payload):
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def mvhd(timescale, duration, version=0):
+    creation_time = int((CREATION_DATETIME - datetime.datetime(1970, 1, 1)).total_seconds()) + QUICKTIME_EPOCH_OFFSET
+    if version == 1:
+        fields = struct.pack('>QQIQ', creation_time, creation_time, timescale, duration)
+    else:
+        fields = struct.pack('>IIII', creation_time, creation_time, timescale, duration)
+    return box(b'mvhd', bytes([version, 0, 0, 0]) + fields + bytes(80))
+
+
+def write_mp4(path, mvhd_box):
+    path.write_bytes(box(b'ftyp', b'isom' + bytes(4)) + box(b'free', bytes(16))
+                     + box(b'moov', box(b'trak', bytes(8)) + mvhd_box) + box(b'mdat', bytes(64)))
+    return str(path)
+
+
+@pytest.mark.parametrize('version', [0, 1])
+def test_mp4_creation_time_and_duration(tmp_path, version):
+    file_path = write_mp4(tmp_path / 'clip.MP4', mvhd(1000, 12345, version))
+    assert read_clip_header(file_path) == (CREATION_DATETIME, 12.345)
+
+
+@pytest.mark.parametrize('version, duration', [(0, 0), (0, 0xffffffff), (1, 0), (1, 0xffffffffffffffff)])
+def test_mp4_unknown_duration_falls_back(tmp_path, version, duration):
+    assert read_clip_header(write_mp4(tmp_path / 'clip.MP4', mvhd(1000, duration, version))) == None
+
+
+def test_mp4_without_mvhd(tmp_path):
+    (tmp_path / 'clip.MP4').write_bytes(box(b'ftyp', b'isom' + bytes(4)) + box(b'mdat', bytes(64)))
+    assert read_clip_header(str(tmp_path / 'clip.MP4')) == None
+
+
+def test_unsupported_extension(tmp_path):
+    assert read_clip_header(write_mp4(tmp_path / 'clip.MOV', mvhd(1000, 12345))) == None
+
+
+def encode_pts(pts):
+    return bytes([0x21 | ((pts >> 29) & 0x0e), (pts >> 22) & 0xff, ((pts >> 14) & 0xfe) | 1, (pts >> 7) & 0xff,
+                  ((pts << 1) & 0xfe) | 1])
+
+
+def mdpm(time_zone=0xff):
+    entries = bytes([0x18, time_zone, 0x20, 0x26, 0x09]) + bytes([0x19, 0x05, 0x16, 0x30, 0x12])
+    return MDPM_UUID + bytes([2]) + entries
+
+
+def ts_packet(payload):
+    header = bytes([0x47, 0x40 | 0x10, 0x11, 0x10])
+    return bytes(4) + header + payload.ljust(TS_PACKET_SIZE - len(header), b'\xff')
+
+
+def write_mts(path, first_pts, frame_count, frame_duration=3003, time_zone=0xff):
+    packets = []
+    for i in range(frame_count):
+        pes_header = b'\x00\x00\x01\xe0\x00\x00\x80\x80\x05' + encode_pts((first_pts + i * frame_duration) % PTS_WRAP)
+        packets.append(ts_packet(pes_header + (mdpm(time_zone) if i == 0 else b'')))
+    path.write_bytes(b''.join(packets))
+    assert len(packets[0]) == MTS_PACKET_SIZE
+    return str(path)
+
+
+def test_mts_duration_includes_the_last_frame(tmp_path):
+    clip_datetime, duration = read_clip_header(write_mts(tmp_path / 'clip.MTS', 90000, 30))
+    assert clip_datetime == CREATION_DATETIME
+    assert duration == pytest.approx(30 * 3003 / 90000)
+
+
+def test_mts_duration_across_pts_wraparound(tmp_path):
+    _, duration = read_clip_header(write_mts(tmp_path / 'clip.MTS', PTS_WRAP - 10 * 3003, 30))
+    assert duration == pytest.approx(30 * 3003 / 90000)
+
+
+def test_mts_time_zone():
+    # Sign bit clear, 9 hours, plus half an hour
+    clip_datetime = parse_mdpm_datetime(mdpm((9 << 1) | 0x01))
+    assert clip_datetime.utcoffset() == datetime.timedelta(hours=9, minutes=30)
+    assert parse_mdpm_datetime(mdpm((5 << 1) | 0x20)).utcoffset() == -datetime.timedelta(hours=5)
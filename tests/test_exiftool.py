@@ -0,0 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import exiftool
+
+
+class FakeWorker:
+    def __init__(self):
+        self.shards = []
+
+    def get_tags_batch(self, tags, filenames):
+        self.shards.append(filenames)
+        return [{'SourceFile': filename} for filename in filenames]
+
+
+@pytest.fixture
+def pool():
+    pool = exiftool.ExifToolPool(3)
+    pool.workers = [FakeWorker() for _ in range(pool.size)]
+    pool._executor = ThreadPoolExecutor(max_workers=pool.size)
+    pool.running = True
+    yield pool
+    pool._executor.shutdown()
+    pool.running = False
+
+
+def test_map_shards_keeps_file_order(pool):
+    filenames = [f'clip{i}.MP4' for i in range(7)]
+    results = pool._map_shards('get_tags_batch', filenames, ['Duration'])
+    assert [result['SourceFile'] for result in results] == filenames
+    assert [len(worker.shards[0]) for worker in pool.workers] == [3, 3, 1]
+
+
+def test_map_shards_with_fewer_files_than_workers(pool):
+    results = pool._map_shards('get_tags_batch', ['a.MP4'], ['Duration'])
+    assert results == [{'SourceFile': 'a.MP4'}]
+    assert [len(worker.shards) for worker in pool.workers] == [1, 0, 0]
+
+
+def test_map_shards_without_files(pool):
+    assert pool._map_shards('get_tags_batch', [], ['Duration']) == []
+    assert all(worker.shards == [] for worker in pool.workers)
+
+
+def test_map_shards_requires_running_pool():
+    with pytest.raises(ValueError):
+        exiftool.ExifToolPool(2)._map_shards('get_tags_batch', ['a.MP4'], ['Duration'])
@@ -0,0 +1,35 @@
+from clipdecoder import ppm_header
+from filmstrip import Filmstrip
+
+
+WIDTH = 4
+HEIGHT = 2
+
+
+def write_filmstrip(path, frame_count):
+    frames = [ppm_header(WIDTH, HEIGHT) + bytes([i]) * (WIDTH * HEIGHT * 3) for i in range(frame_count)]
+    path.write_bytes(b''.join(frames))
+    return frames
+
+
+def test_frame_at_whole_seconds(tmp_path):
+    frames = write_filmstrip(tmp_path / 'clip.ppms', 3)
+    filmstrip = Filmstrip(str(tmp_path / 'clip.ppms'), WIDTH, HEIGHT)
+    try:
+        assert filmstrip.frame_count == 3
+        # Tk only takes image data as bytes; a memoryview would be handed to it as its repr
+        assert type(filmstrip.frame_at(1)) is bytes
+        assert [filmstrip.frame_at(t) for t in range(3)] == frames
+    finally:
+        filmstrip.close()
+
+
+def test_frame_at_leaves_other_times_to_the_decoder(tmp_path):
+    write_filmstrip(tmp_path / 'clip.ppms', 3)
+    filmstrip = Filmstrip(str(tmp_path / 'clip.ppms'), WIDTH, HEIGHT)
+    try:
+        assert filmstrip.frame_at(1.5) == None
+        assert filmstrip.frame_at(3) == None
+        assert filmstrip.frame_at(-1) == None
+    finally:
+        filmstrip.close()
@@ -0,0 +1,61 @@
+import os
+import time
+
+import pytest
+
+from folderwatch import FolderWatcher, load_libc_inotify
+from outputmanifest import OutputManifest
+
+
+def wait_for_changes(folder_watcher, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        changed_paths, removed_paths = folder_watcher.get_changes()
+        if changed_paths or removed_paths:
+            return changed_paths, removed_paths
+        time.sleep(0.05)
+    return set(), set()
+
+
+def test_placeholders_are_not_reported_as_clips(tmp_path):
+    clip_path = str(tmp_path / 'aic0002.MP4')
+    placeholder_path = str(tmp_path / 'aic0001.mp4')
+    output_manifest = OutputManifest(str(tmp_path))
+    (tmp_path / 'blank.mp4').write_bytes(b'blank')
+    output_manifest.plan(placeholder_path, 'placeholder', str(tmp_path / 'blank.mp4'))
+    output_manifest.save()
+
+    folder_watcher = FolderWatcher(str(tmp_path))
+    folder_watcher.changes.put(({clip_path, placeholder_path}, set()))
+    # The placeholder took the name of a clip listed before, which has to go
+    assert folder_watcher.get_changes() == ({clip_path}, {placeholder_path})
+
+
+@pytest.mark.skipif(not load_libc_inotify(), reason='inotify is not available')
+def test_hardlinked_clips_are_reported(tmp_path):
+    source_path = tmp_path / 'C0001.MP4'
+    source_path.write_bytes(b'footage')
+    (tmp_path / 'Sideline').mkdir()
+    folder_watcher = FolderWatcher(str(tmp_path / 'Sideline')).start()
+    try:
+        time.sleep(0.1)
+        os.link(source_path, tmp_path / 'Sideline' / 'C0001.MP4')
+        assert wait_for_changes(folder_watcher) == ({str(tmp_path / 'Sideline' / 'C0001.MP4')}, set())
+    finally:
+        folder_watcher.stop()
+
+
+@pytest.mark.skipif(not load_libc_inotify(), reason='inotify is not available')
+def test_clips_are_reported_once_written(tmp_path):
+    folder_watcher = FolderWatcher(str(tmp_path)).start()
+    try:
+        time.sleep(0.1)
+        with open(tmp_path / 'C0001.MP4', 'wb') as clip_file:
+            clip_file.write(b'foot')
+            time.sleep(0.2)
+            # Still being copied in
+            assert folder_watcher.get_changes() == (set(), set())
+            clip_file.write(b'age')
+        assert wait_for_changes(folder_watcher) == ({str(tmp_path / 'C0001.MP4')}, set())
+    finally:
+        folder_watcher.stop()
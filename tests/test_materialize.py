@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pytest
+
+import materialize
+from cutpool import CutJob, run_cut_job
+from materialize import kernel_copy_file, materialize_file
+
+
+def test_output_never_shares_the_source_inode(tmp_path):
+    source_path = tmp_path / 'C0001.MP4'
+    source_path.write_bytes(b'footage' * 1000)
+    output_path = tmp_path / 'output' / 'aic0001.MP4'
+    output_path.parent.mkdir()
+    materialize_file(str(source_path), str(output_path))
+    assert not os.path.samefile(source_path, output_path)
+    # What a later cut into the same name does
+    with open(output_path, 'wb'):
+        pass
+    assert source_path.read_bytes() == b'footage' * 1000
+
+
+def test_short_kernel_copy_falls_back(monkeypatch, tmp_path):
+    if not hasattr(os, 'copy_file_range'):
+        pytest.skip('copy_file_range is not supported on this platform')
+    source_path = tmp_path / 'C0001.MP4'
+    source_path.write_bytes(b'footage' * 1000)
+    monkeypatch.setattr(os, 'copy_file_range', lambda source, output, count: 0)
+    with pytest.raises(OSError):
+        kernel_copy_file(str(source_path), str(tmp_path / 'short.MP4'))
+
+    def no_reflink(source_path, output_path):
+        raise OSError('no reflinks here')
+
+    monkeypatch.setattr(materialize, 'MATERIALIZE_METHODS', [no_reflink, kernel_copy_file,
+                                                             materialize.buffered_copy_file])
+    assert materialize_file(str(source_path), str(tmp_path / 'aic0001.MP4')) == 'buffered_copy_file'
+    assert (tmp_path / 'aic0001.MP4').read_bytes() == b'footage' * 1000
+
+
+def test_cut_job_does_not_write_through_a_linked_output(tmp_path):
+    if not hasattr(os, 'link'):
+        pytest.skip('hardlinks are not supported on this platform')
+    source_path = tmp_path / 'C0001.MP4'
+    source_path.write_bytes(b'footage')
+    output_path = tmp_path / 'aic0001.MP4'
+    os.link(source_path, output_path)
+    # Stands in for ffmpeg -y, which truncates an existing output
+    run_cut_job(CutJob([sys.executable, '-c', f'open({str(output_path)!r}, "wb").write(b"cut")'], str(output_path)))
+    assert source_path.read_bytes() == b'footage'
+    assert output_path.read_bytes() == b'cut'
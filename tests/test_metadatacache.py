@@ -0,0 +1,47 @@
+import datetime
+import os
+
+import autointercututils
+import metadatacache
+from autointercututils import Clip, normalize_path, with_metadata
+from metadatacache import MetadataCache
+
+
+CLIP_DATETIME = datetime.datetime(2026, 9, 5, 16, 30, 12)
+
+
+def test_entries_last_until_the_file_changes(tmp_path):
+    clip_path = tmp_path / 'C0001.MP4'
+    clip_path.write_bytes(b'footage')
+    with MetadataCache(str(tmp_path / 'cache.sqlite')) as cache:
+        cache.put(str(clip_path), os.stat(clip_path), CLIP_DATETIME, 12.5)
+        assert cache.get(str(clip_path), os.stat(clip_path)) == (CLIP_DATETIME, 12.5)
+        clip_path.write_bytes(b'longer footage')
+        assert cache.get(str(clip_path), os.stat(clip_path)) == None
+
+
+def test_probing_does_not_hold_the_cache_locked(monkeypatch, tmp_path):
+    cache_path = str(tmp_path / 'cache.sqlite')
+    cached_path = tmp_path / 'C0001.MP4'
+    probed_path = tmp_path / 'C0002.MP4'
+    cached_path.write_bytes(b'footage')
+    probed_path.write_bytes(b'not a container header')
+    with MetadataCache(cache_path) as cache:
+        cache.put(str(cached_path), os.stat(cached_path), CLIP_DATETIME, 12.5)
+
+    def probe_from_another_window(et, tags, file_paths):
+        # The other angle's probe writes to the same cache while this one waits on exiftool
+        monkeypatch.setattr(metadatacache, 'CACHE_LOCK_TIMEOUT_SECONDS', 0.1)
+        with MetadataCache(cache_path) as other_cache:
+            other_cache.put(str(tmp_path / 'elsewhere.MP4'), os.stat(cached_path), CLIP_DATETIME, 1)
+        return {normalize_path(file_path): {'CreateDate': '2026:09:05 16:31:00', 'Duration': 10.0}
+                for file_path in file_paths}
+
+    class FakePool:
+        running = True
+        size = 1
+
+    monkeypatch.setattr(autointercututils, 'get_tags_by_path', probe_from_another_window)
+    with MetadataCache(cache_path) as cache:
+        clips = with_metadata([Clip(str(cached_path)), Clip(str(probed_path))], et=FakePool(), cache=cache)
+    assert [clip.duration for clip in clips] == [12.5, 10.0]
@@ -0,0 +1,95 @@
+import os
+
+from outputmanifest import OUTPUT_MANIFEST_NAME, OutputManifest, get_placeholder_paths
+
+
+def make_source(tmp_path, name='clip.MP4', size=100):
+    source_path = tmp_path / name
+    source_path.write_bytes(bytes(size))
+    return str(source_path)
+
+
+def finish(output_manifest, output_path, size=10):
+    with open(output_path, 'wb') as output_file:
+        output_file.write(bytes(size))
+    output_manifest.mark_done(output_path)
+
+
+def test_done_output_with_an_unchanged_plan_is_skipped(tmp_path):
+    source_path = make_source(tmp_path)
+    output_path = str(tmp_path / 'clip_cut1.MP4')
+    output_manifest = OutputManifest(str(tmp_path))
+    assert not output_manifest.plan(output_path, 'cut', source_path, 12, 18, 'COPY')
+    finish(output_manifest, output_path)
+    assert output_manifest.plan(output_path, 'cut', source_path, 12, 18, 'COPY')
+    assert output_manifest.is_done(output_path)
+
+
+def test_changed_plan_is_redone(tmp_path):
+    source_path = make_source(tmp_path)
+    other_source_path = make_source(tmp_path, 'other.MP4')
+    output_path = str(tmp_path / 'clip_cut1.MP4')
+    output_manifest = OutputManifest(str(tmp_path))
+    for changed_plan in [('cut', other_source_path, 12, 18, 'COPY'), ('cut', source_path, 13, 18, 'COPY'),
+                         ('cut', source_path, 12, 19, 'COPY'), ('cut', source_path, 12, 18, 'SMART_RENDER')]:
+        output_manifest.plan(output_path, 'cut', source_path, 12, 18, 'COPY')
+        finish(output_manifest, output_path)
+        assert not output_manifest.plan(output_path, *changed_plan)
+
+
+def test_changed_source_is_redone(tmp_path):
+    source_path = make_source(tmp_path)
+    output_path = str(tmp_path / 'aic0001.MP4')
+    output_manifest = OutputManifest(str(tmp_path))
+    output_manifest.plan(output_path, 'copy', source_path)
+    finish(output_manifest, output_path)
+    make_source(tmp_path, size=200)
+    assert not output_manifest.plan(output_path, 'copy', source_path)
+
+
+def test_truncated_missing_and_failed_outputs_are_redone(tmp_path):
+    source_path = make_source(tmp_path)
+    output_path = str(tmp_path / 'clip_cut1.MP4')
+    output_manifest = OutputManifest(str(tmp_path))
+
+    output_manifest.plan(output_path, 'cut', source_path, 0, 5)
+    finish(output_manifest, output_path)
+    with open(output_path, 'wb') as output_file:
+        output_file.write(bytes(3))
+    assert not output_manifest.plan(output_path, 'cut', source_path, 0, 5)
+
+    finish(output_manifest, output_path)
+    os.remove(output_path)
+    assert not output_manifest.plan(output_path, 'cut', source_path, 0, 5)
+
+    finish(output_manifest, output_path)
+    output_manifest.plan(output_path, 'cut', source_path, 0, 6)
+    output_manifest.mark_failed(output_path)
+    assert not output_manifest.plan(output_path, 'cut', source_path, 0, 6)
+
+
+def test_manifest_is_saved_as_outputs_finish(tmp_path):
+    source_path = make_source(tmp_path)
+    output_path = str(tmp_path / 'clip_cut1.MP4')
+    output_manifest = OutputManifest(str(tmp_path))
+    output_manifest.plan(output_path, 'cut', source_path, 0, 5)
+    finish(output_manifest, output_path)
+    assert OutputManifest(str(tmp_path)).plan(output_path, 'cut', source_path, 0, 5)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_unreadable_manifest_redoes_everything(tmp_path):
+    (tmp_path / OUTPUT_MANIFEST_NAME).write_text('{"version": 1, "outp')
+    assert OutputManifest(str(tmp_path)).entries == {}
+    (tmp_path / OUTPUT_MANIFEST_NAME).write_text('{"version": 0, "outputs": {"aic0001.MP4": {}}}')
+    assert OutputManifest(str(tmp_path)).entries == {}
+
+
+def test_placeholder_paths(tmp_path):
+    blank_path = make_source(tmp_path, 'blank.mp4')
+    source_path = make_source(tmp_path, 'clip.MP4')
+    output_manifest = OutputManifest(str(tmp_path))
+    output_manifest.plan(str(tmp_path / 'aic0001.mp4'), 'placeholder', blank_path)
+    output_manifest.plan(str(tmp_path / 'aic0002.MP4'), 'rename', source_path)
+    output_manifest.save()
+    assert get_placeholder_paths(str(tmp_path)) == {str(tmp_path / 'aic0001.mp4')}
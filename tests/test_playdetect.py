@@ -0,0 +1,57 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from playdetect import (DETECT_FRAME_RATE, DETECT_HEIGHT, DETECT_WIDTH, detect_plays, plays_to_marks,
+                        score_frames)
+
+
+def practice_frames(seconds, plays, noise=0, seed=1):
+    # A static field with a block sweeping across it during each (start, end) play, in seconds
+    rng = np.random.default_rng(seed)
+    frames = np.full((seconds * DETECT_FRAME_RATE, DETECT_HEIGHT, DETECT_WIDTH), 100, dtype=np.uint8)
+    for start, end in plays:
+        for i in range(start * DETECT_FRAME_RATE, end * DETECT_FRAME_RATE):
+            x = (i * 5) % (DETECT_WIDTH - 16)
+            frames[i, 10:26, x:x + 16] = 220
+    if noise:
+        frames = np.clip(frames + rng.normal(0, noise, frames.shape), 0, 255).astype(np.uint8)
+    return frames
+
+
+@pytest.mark.parametrize('noise', [0, 2])
+def test_detects_each_play(noise):
+    plays = [(10, 18), (30, 36), (50, 60)]
+    detected = detect_plays(*score_frames(practice_frames(70, plays, noise)))
+    assert len(detected) == len(plays)
+    for (start, end), (detected_start, detected_end) in zip(plays, detected):
+        assert detected_start == pytest.approx(start, abs=1)
+        assert detected_end == pytest.approx(end, abs=1)
+
+
+def test_static_footage_has_no_plays():
+    assert detect_plays(*score_frames(practice_frames(30, []))) == []
+
+
+def test_black_frames_are_not_plays():
+    frames = practice_frames(40, [(10, 20)])
+    frames[10 * DETECT_FRAME_RATE:20 * DETECT_FRAME_RATE] //= 16
+    assert detect_plays(*score_frames(frames)) == []
+
+
+def test_no_frames():
+    motion, black = score_frames(np.zeros((0, DETECT_HEIGHT, DETECT_WIDTH), dtype=np.uint8))
+    assert len(motion) == 0 and len(black) == 0
+    assert detect_plays(motion, black) == []
+
+
+def test_marks_get_pre_and_post_roll():
+    assert plays_to_marks([(10, 18), (30.5, 36.2)], 70) == [9, 19, 29, 38]
+
+
+def test_marks_never_overlap_or_pass_the_clip_end():
+    assert plays_to_marks([(10, 18), (19, 25), (66, 69.5)], 70) == [9, 19, 20, 26, 65, 70]
+
+
+def test_marks_drop_plays_squeezed_out_by_the_previous_one():
+    assert plays_to_marks([(0, 9.5), (10, 10.2)], 11) == [0, 11]
@@ -0,0 +1,38 @@
+import os
+
+from keyframeindex import KeyframeIndex
+from smartrender import VideoEncoding, plan_smart_cut
+
+
+KEYFRAMES = KeyframeIndex([0, 2, 4, 6, 8, 10])
+
+
+def test_plan_splits_range_into_encoded_and_copied_parts(tmp_path):
+    output_path = str(tmp_path / 'aic0001.MTS')
+    job = plan_smart_cut('source.MTS', 1, 8, output_path, KEYFRAMES, VideoEncoding('h264', 'yuv420p', 'mpegts'))
+    assert [command[-1] for command in job.commands] == [f'{output_path}.head.ts', f'{output_path}.middle.ts',
+                                                         f'{output_path}.tail.ts', output_path]
+    assert job.output_ranges == {output_path: ('source.MTS', 1, 8)}
+
+
+def test_plan_leaves_nothing_on_disk(tmp_path):
+    output_path = str(tmp_path / 'aic0001.MTS')
+    job = plan_smart_cut('source.MTS', 1, 8, output_path, KEYFRAMES, VideoEncoding('h264', 'yuv420p', 'mpegts'))
+    assert os.listdir(tmp_path) == []
+    concat_list_path, = job.scratch_files
+    assert concat_list_path in job.scratch_paths
+    assert job.scratch_files[concat_list_path].count('file ') == 3
+
+
+def test_mp4_sources_are_encoded_over_the_whole_range(tmp_path):
+    output_path = str(tmp_path / 'aic0001.MP4')
+    job = plan_smart_cut('source.MP4', 1, 8, output_path, KEYFRAMES,
+                         VideoEncoding('h264', 'yuv420p', 'mov,mp4,m4a,3gp,3g2,mj2'))
+    assert len(job.commands) == 1
+    assert 'libx264' in job.args and job.args[-1] == output_path
+
+
+def test_range_without_an_inner_keyframe_is_encoded_in_one_piece(tmp_path):
+    output_path = str(tmp_path / 'aic0001.MTS')
+    job = plan_smart_cut('source.MTS', 2.5, 1, output_path, KEYFRAMES, VideoEncoding('h264', None, 'mpegts'))
+    assert len(job.commands) == 1
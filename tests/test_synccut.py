@@ -0,0 +1,72 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import autointercut
+from autointercut import materialize_placeholder, sync_cut_clip_groups
+from autointercututils import Clip
+from outputmanifest import OutputManifest
+
+
+def make_group(directory, clips):
+    # clips are (file name, start seconds, duration); each file holds its own name so moves can be followed
+    os.makedirs(directory, exist_ok=True)
+    for file_name, _, _ in clips:
+        with open(os.path.join(directory, file_name), 'w') as clip_file:
+            clip_file.write(file_name)
+    return SimpleNamespace(directory=directory, clips=[Clip(os.path.join(directory, file_name), start, duration, start)
+                                                       for file_name, start, duration in clips])
+
+
+def read(path):
+    with open(path) as clip_file:
+        return clip_file.read()
+
+
+@pytest.fixture(autouse=True)
+def blank_movie(monkeypatch, tmp_path):
+    blank_path = tmp_path / 'blank.mp4'
+    blank_path.write_text('blank')
+    monkeypatch.setattr(autointercut, 'BLANK_MOVIE_PATH', str(blank_path))
+
+
+def test_rename_and_pad(tmp_path):
+    base = make_group(str(tmp_path / 'EndZone'), [('C0001.mp4', 0, 10), ('C0002.mp4', 20, 10)])
+    secondary = make_group(str(tmp_path / 'Sideline'), [('C0101.mp4', 21, 10)])
+    sync_cut_clip_groups([base, secondary])
+    assert sorted(os.listdir(base.directory)) == ['aic0001.mp4', 'aic0002.mp4', 'aic_manifest.json']
+    assert read(os.path.join(secondary.directory, 'aic0001.mp4')) == 'blank'
+    assert read(os.path.join(secondary.directory, 'aic0002.mp4')) == 'C0101.mp4'
+
+
+def test_shifted_rerun_does_not_write_a_placeholder_over_a_clip(tmp_path):
+    # An earlier run named the secondary's only clip aic0001.mp4; with the base's earlier clip now in the timeline it
+    # belongs in row 2, and row 1 gets a placeholder under its old name
+    base = make_group(str(tmp_path / 'EndZone'), [('C0001.mp4', 0, 10), ('C0002.mp4', 20, 10)])
+    secondary = make_group(str(tmp_path / 'Sideline'), [('aic0001.mp4', 21, 10)])
+    sync_cut_clip_groups([base, secondary])
+    assert read(os.path.join(secondary.directory, 'aic0001.mp4')) == 'blank'
+    assert read(os.path.join(secondary.directory, 'aic0002.mp4')) == 'aic0001.mp4'
+    assert sorted(os.listdir(secondary.directory)) == ['aic0001.mp4', 'aic0002.mp4', 'aic_manifest.json']
+
+
+def test_shifted_rerun_with_upper_case_extensions(tmp_path):
+    # aic0001.MP4 and the aic0001.mp4 placeholder are one file on a case-insensitive filesystem
+    base = make_group(str(tmp_path / 'EndZone'), [('C0001.MP4', 0, 10), ('C0002.MP4', 20, 10)])
+    secondary = make_group(str(tmp_path / 'Sideline'), [('aic0001.MP4', 21, 10)])
+    sync_cut_clip_groups([base, secondary])
+    assert read(os.path.join(secondary.directory, 'aic0002.MP4')) == 'aic0001.MP4'
+    assert not os.path.exists(os.path.join(secondary.directory, 'aic_renaming_aic0001.MP4'))
+
+
+def test_placeholder_refuses_to_overwrite_an_unrenamed_clip(tmp_path):
+    clip_path = str(tmp_path / 'aic0001.MP4')
+    with open(clip_path, 'w') as clip_file:
+        clip_file.write('footage')
+    output_manifest = OutputManifest(str(tmp_path))
+    with pytest.raises(OSError):
+        materialize_placeholder(str(tmp_path / 'aic0001.mp4'), output_manifest,
+                                {autointercut.get_rename_key(clip_path)})
+    assert read(clip_path) == 'footage'
+    assert output_manifest.entries == {}
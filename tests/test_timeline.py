@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+
+from autointercut import get_synchronized_grouping, get_synchronized_timeline
+from autointercututils import Clip
+
+
+def clip_group(name, clip_times):
+    # clip_times are (synchronize time, duration) pairs, already in synchronize time order
+    clips = [Clip(f'{name}{i}.MP4', synchronize_time, duration, synchronize_time)
+             for i, (synchronize_time, duration) in enumerate(clip_times)]
+    return SimpleNamespace(directory=name, clips=clips)
+
+
+def test_overlapping_clips_share_a_row():
+    base = clip_group('base', [(0, 10), (20, 10)])
+    secondary = clip_group('secondary', [(2, 10), (21, 5)])
+    assert get_synchronized_timeline([base, secondary]) == [('base0.MP4', 'secondary0.MP4'),
+                                                           ('base1.MP4', 'secondary1.MP4')]
+
+
+def test_unmatched_clips_get_rows_of_their_own():
+    base = clip_group('base', [(0, 10), (50, 10)])
+    secondary = clip_group('secondary', [(20, 10), (51, 5)])
+    assert get_synchronized_timeline([base, secondary]) == [('base0.MP4', None),
+                                                           (None, 'secondary0.MP4'),
+                                                           ('base1.MP4', 'secondary1.MP4')]
+
+
+def test_a_clip_starting_after_the_row_clip_ends_starts_a_new_row():
+    base = clip_group('base', [(0, 10)])
+    secondary = clip_group('secondary', [(10, 5)])
+    assert get_synchronized_timeline([base, secondary]) == [('base0.MP4', None), (None, 'secondary0.MP4')]
+
+
+def test_three_angles():
+    groups = [clip_group('a', [(0, 10), (30, 10)]),
+              clip_group('b', [(1, 10)]),
+              clip_group('c', [(2, 5), (31, 5)])]
+    assert get_synchronized_timeline(groups) == [('a0.MP4', 'b0.MP4', 'c0.MP4'), ('a1.MP4', None, 'c1.MP4')]
+
+
+def test_empty_groups():
+    assert get_synchronized_timeline([clip_group('a', []), clip_group('b', [])]) == []
+    assert get_synchronized_grouping(clip_group('a', [(0, 10)]), clip_group('b', [])) == [('a0.MP4', None)]
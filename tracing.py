@@ -0,0 +1,146 @@
+import atexit
+import functools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+
+TRACE_ENV = 'AUTOINTERCUT_TRACE'
+
+enabled = False
+trace_path = None
+events = []
+events_lock = threading.Lock()
+trace_started_at = time.perf_counter()
+
+
+class NullSpan:
+    # Shared do-nothing span so disabled tracing costs one global lookup per call site
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    __slots__ = ['name', 'category', 'args', 'started_at']
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.started_at = None
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        ended_at = time.perf_counter()
+        if exc_type != None and 'error' not in self.args:
+            self.args['error'] = exc_type.__name__
+        event = {'name': self.name,
+                 'cat': self.category,
+                 'ph': 'X',
+                 'ts': (self.started_at - trace_started_at) * 10 ** 6,
+                 'dur': (ended_at - self.started_at) * 10 ** 6,
+                 'pid': os.getpid(),
+                 'tid': threading.get_ident(),
+                 'args': self.args}
+        with events_lock:
+            events.append(event)
+        return False
+
+    def set(self, **args):
+        self.args.update(args)
+
+
+def span(name, category='stage', **args):
+    if not enabled:
+        return NULL_SPAN
+    return Span(name, category, args)
+
+
+def traced(name=None):
+    def decorate(function):
+        span_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with Span(span_name, 'stage', {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def process_span(command, **args):
+    if not enabled:
+        return NULL_SPAN
+    return Span(os.path.basename(command[0]), 'process', dict(args, command=' '.join(map(str, command))))
+
+
+def check_output(command, **kwargs):
+    if not enabled:
+        return subprocess.check_output(command, **kwargs)
+    with process_span(command) as process:
+        try:
+            output = subprocess.check_output(command, **kwargs)
+        except subprocess.CalledProcessError as e:
+            process.set(exit_status=e.returncode)
+            raise
+        process.set(exit_status=0, bytes_out=len(output))
+        return output
+
+
+def enable(path):
+    global enabled, trace_path
+    if enabled:
+        return
+    enabled = True
+    trace_path = path
+    atexit.register(write_trace)
+
+
+def write_trace():
+    with events_lock:
+        recorded_events = list(events)
+    with open(trace_path, 'w') as trace_file:
+        json.dump({'traceEvents': recorded_events, 'displayTimeUnit': 'ms'}, trace_file)
+    print_summary(recorded_events)
+
+
+def print_summary(recorded_events, file=None):
+    file = file or sys.stderr
+    totals = {}
+    for event in recorded_events:
+        key = (event['cat'], event['name'])
+        count, seconds, max_seconds, byte_count, failures = totals.get(key, (0, 0, 0, 0, 0))
+        event_seconds = event['dur'] / 10 ** 6
+        totals[key] = (count + 1,
+                       seconds + event_seconds,
+                       max(max_seconds, event_seconds),
+                       byte_count + event['args'].get('bytes_out', 0) + event['args'].get('bytes_in', 0),
+                       failures + (1 if event['args'].get('exit_status', 0) != 0 or 'error' in event['args'] else 0))
+
+    print(f'{"category":<10} {"name":<28} {"count":>7} {"total s":>10} {"mean ms":>10} {"max ms":>10} '
+          f'{"MB":>10} {"failed":>7}', file=file)
+    for (category, name), (count, seconds, max_seconds, byte_count, failures) in \
+            sorted(totals.items(), key=lambda item: -item[1][1]):
+        print(f'{category:<10} {name:<28} {count:>7} {seconds:>10.3f} {seconds / count * 1000:>10.1f} '
+              f'{max_seconds * 1000:>10.1f} {byte_count / 10 ** 6:>10.1f} {failures:>7}', file=file)
+
+
+if os.environ.get(TRACE_ENV):
+    enable(os.environ[TRACE_ENV])